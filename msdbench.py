@@ -0,0 +1,254 @@
+#benchmark of MSD/diffusion pipeline - synthetic trajectories of Brownian walkers with known
+#diffusion coefficient are generated for grid of natoms x nframes (optionally wrapped into
+#periodic box), every stage of pipeline (parse, unwrap, MSD, fit) is timed for every engine
+#and recovered diffusion coefficient is checked against ground truth
+#
+#results are written to JSON file, scaling plots to PNG file (if matplotlib is available),
+#exit code is 1 if recovered diffusion of any run does not match ground truth
+#
+#with --startup only start of command line interface is checked - import time is measured by
+#python -X importtime in fresh interpreters, import time beyond numpy has to fit into budget
+#and scipy, matplotlib and Qt must not be imported (they are loaded only when needed)
+#
+#example:
+# python msdbench.py --natoms 100 1000 --nframes 1000 10000 --pbc -o bench.json --plot bench.png
+# python msdbench.py --startup
+
+#argparse library - used for using command line arguments
+import argparse
+
+#json library - used for machine-readable results
+import json
+
+#os, tempfile and time libraries - used for generated trajectories and timing
+import os
+import sys
+import tempfile
+import time
+
+#subprocess library - used for measurement of import time in fresh interpreter
+import subprocess
+
+#numpy library
+import numpy as np
+
+#stages of the pipeline
+from xyzreader import PRECISIONS, read_xyz
+from pbc import unwrap
+from msdengine import ENGINES, compute_msd
+from msdfit import select_window, fit_diffusion, bootstrap_diffusion
+
+
+#ground truth of generated trajectories - diffusion coefficient, time step and box length
+DIFFUSION = 0.1
+TIME_STEP = 1.0
+BOX_LENGTH = 20.0
+
+#diffusion is fitted on lag times up to FIT_TIME*longest time, error is estimated from blocks
+#of atoms and recovered diffusion has to be within ERROR_TOLERANCE standard errors of truth
+FIT_TIME = 0.1
+ERROR_BLOCKS = 10
+ERROR_TOLERANCE = 5.0
+
+#direct engine is O(natoms*nt^2), longer trajectories are skipped
+DIRECT_MAX_FRAMES = 2000
+
+#startup check - budget of import time of command line interface beyond numpy (median of runs)
+#and packages which must not be imported at startup
+STARTUP_MODULE = "msdcli"
+STARTUP_BUDGET_MS = 150.0
+STARTUP_RUNS = 5
+STARTUP_FORBIDDEN = ("scipy", "matplotlib", "PyQt5", "h5py")
+
+
+#--------------------------------------------------------------------------------------------
+# Brownian walkers - every step is normal displacement with variance 2*D*dt in every dimension, |
+# coordinates are wrapped into box [0, BOX_LENGTH) if pbc is set, frame time is in header     |
+#--------------------------------------------------------------------------------------------
+def write_trajectory(fn, natoms, nframes, pbc=False, seed=0):
+
+	rng = np.random.default_rng(seed)
+	sigma = np.sqrt(2.0*DIFFUSION*TIME_STEP)
+	r = rng.uniform(0.0, BOX_LENGTH, (natoms, 3))
+	with open(fn, "w") as fout:
+		for it in range(nframes):
+			if it > 0:
+				r += rng.normal(0.0, sigma, (natoms, 3))
+			xyz = np.mod(r, BOX_LENGTH) if pbc else r
+			fout.write("{}\ntime = {}\n".format(natoms, it*TIME_STEP))
+			np.savetxt(fout, xyz, fmt="C %.6f %.6f %.6f")
+
+
+#------------------------------------------------------------------------------------------
+# one run of pipeline stages with timing, returns record with stage times and diffusion |
+#------------------------------------------------------------------------------------------
+def run_stages(fn, natoms, nframes, engine, pbc=False, workers=1, precision="double"):
+
+	times = {}
+	start = time.perf_counter()
+	traj = read_xyz(fn, dtype=PRECISIONS[precision])
+	times["parse"] = time.perf_counter() - start
+
+	start = time.perf_counter()
+	r = traj.atom_series()
+	if pbc:
+		r = unwrap(r, [BOX_LENGTH]*3)
+	times["unwrap"] = time.perf_counter() - start
+
+	#MSD of all atoms and of interleaved blocks of atoms for error estimate in the same pass
+	block = np.arange(natoms) % ERROR_BLOCKS
+	groups = np.vstack(([np.ones(natoms)], [(block == ib).astype(np.float64) for ib in range(ERROR_BLOCKS)]))
+	start = time.perf_counter()
+	msd = compute_msd(r, engine, workers=workers, groups=groups)
+	times["msd"] = time.perf_counter() - start
+
+	t = np.asarray(traj.times)[:nframes-1]
+	start = time.perf_counter()
+	diff_x, diff_y = select_window(t, msd[0], TIME_STEP, FIT_TIME*t[-1])
+	d = fit_diffusion(diff_x, diff_y)
+	times["fit"] = time.perf_counter() - start
+
+	_, block_y = select_window(t, msd[1:].T, TIME_STEP, FIT_TIME*t[-1])
+	_, error = bootstrap_diffusion(diff_x, block_y.T, groups[1:].sum(axis=1))
+	ok = bool(abs(d - DIFFUSION) <= ERROR_TOLERANCE*error)
+
+	return {"natoms": natoms, "nframes": nframes, "engine": engine, "pbc": pbc, "workers": workers, "precision": precision,
+		"times": times, "total": sum(times.values()), "diffusion": d, "diffusion_error": error,
+		"diffusion_true": DIFFUSION, "ok": ok}
+
+
+#------------------------------------------------------------------
+# scaling plots - MSD time and total time vs frames for every engine |
+#------------------------------------------------------------------
+def plot_results(results, fn):
+
+	try:
+		import matplotlib
+		matplotlib.use("Agg")
+		import matplotlib.pyplot as plt
+	except ImportError:
+		print("warning: matplotlib is not available, plot is not written", file=sys.stderr)
+		return
+
+	fig, axes = plt.subplots(1, 2, figsize=(11, 4.5))
+	for ax, key, title in zip(axes, ("msd", "total"), ("MSD stage", "whole pipeline")):
+		for engine in sorted({res["engine"] for res in results}):
+			for natoms in sorted({res["natoms"] for res in results}):
+				runs = sorted((res["nframes"], res["times"]["msd"] if key == "msd" else res["total"])
+					for res in results if res["engine"] == engine and res["natoms"] == natoms)
+				if runs:
+					ax.plot(*zip(*runs), "o-", label="{} natoms={}".format(engine, natoms))
+		ax.set_xscale("log")
+		ax.set_yscale("log")
+		ax.set_xlabel("frames")
+		ax.set_ylabel("time [s]")
+		ax.set_title(title)
+		ax.grid(True)
+	axes[0].legend(fontsize="small")
+	fig.tight_layout()
+	fig.savefig(fn)
+
+
+#---------------------------------------------------------------------------------------------
+# import of module in fresh interpreter (python -X importtime) - cumulative import time of    |
+# module and of numpy in ms, forbidden packages which were imported on the way                |
+#---------------------------------------------------------------------------------------------
+def measure_import(module=STARTUP_MODULE):
+
+	proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], capture_output=True, text=True,
+		cwd=os.path.dirname(os.path.abspath(__file__)))
+	if proc.returncode != 0:
+		raise RuntimeError("Import of {} failed: {}".format(module, proc.stderr.strip().splitlines()[-1]))
+
+	#lines "import time: self [us] | cumulative | name", nested modules are indented
+	cumulative = {}
+	for line in proc.stderr.splitlines():
+		parts = line.split("|")
+		if len(parts) == 3 and parts[1].strip().isdigit():
+			cumulative[parts[2].strip()] = int(parts[1])/1000.0
+	forbidden = sorted({name.split(".")[0] for name in cumulative if name.split(".")[0] in STARTUP_FORBIDDEN})
+	return cumulative[module], cumulative.get("numpy", 0.0), forbidden
+
+
+#median import time of runs checked against budget (ms beyond numpy)
+def check_startup(budget=STARTUP_BUDGET_MS, runs=STARTUP_RUNS):
+
+	measured = [measure_import() for _ in range(runs)]
+	total = float(np.median([m[0] for m in measured]))
+	own = float(np.median([m[0] - m[1] for m in measured]))
+	forbidden = sorted(set(sum((m[2] for m in measured), [])))
+	return {"module": STARTUP_MODULE, "import_ms": total, "beyond_numpy_ms": own, "budget_ms": budget, "forbidden": forbidden,
+		"ok": own <= budget and not forbidden}
+
+
+def build_parser():
+
+	parser = argparse.ArgumentParser(description="Benchmark of MSD/diffusion pipeline on synthetic random-walk trajectories.")
+	parser.add_argument("--natoms",nargs="+",type=int,default=[100,1000],metavar="N",
+				help="numbers of atoms of generated trajectories (default 100 1000)")
+	parser.add_argument("--nframes",nargs="+",type=int,default=[1000,10000],metavar="N",
+				help="numbers of frames of generated trajectories (default 1000 10000)")
+	parser.add_argument("--engines",nargs="+",choices=sorted(ENGINES),default=sorted(ENGINES),
+				help="benchmarked MSD engines (default all)")
+	parser.add_argument("--pbc",help="trajectories are wrapped into periodic box and unwrapped by pipeline",
+				action="store_true")
+	parser.add_argument("--workers",type=int,default=1,metavar="N",
+				help="number of worker processes for MSD calculation (default 1)")
+	parser.add_argument("--precision",choices=sorted(PRECISIONS),default="double",
+				help="storage precision of parsed coordinates (default double)")
+	parser.add_argument("--quick",help="small grid for quick check (natoms 50, frames 200 500)",
+				action="store_true")
+	parser.add_argument("-o","--output",default="msdbench.json",help="JSON file with results (default msdbench.json)")
+	parser.add_argument("--plot",help="PNG file with scaling plots")
+	parser.add_argument("--dir",help="directory for generated trajectories (default temporary directory)")
+	parser.add_argument("--startup",help="check only import time of command line interface against budget",
+				action="store_true")
+	parser.add_argument("--startup-budget",type=float,default=STARTUP_BUDGET_MS,metavar="MS",
+				help="budget of import time beyond numpy in ms (default {:g})".format(STARTUP_BUDGET_MS))
+	return parser
+
+
+def main(argv=None):
+
+	args = build_parser().parse_args(argv)
+	if args.startup:
+		res = check_startup(args.startup_budget)
+		print("import {}: {:.1f} ms, {:.1f} ms beyond numpy (budget {:g} ms){} {}".format(res["module"], res["import_ms"],
+			res["beyond_numpy_ms"], res["budget_ms"], ", imports " + ", ".join(res["forbidden"]) if res["forbidden"] else "",
+			"ok" if res["ok"] else "FAILED"))
+		with open(args.output, "w") as fout:
+			json.dump({"startup": res}, fout, indent=1)
+		return 0 if res["ok"] else 1
+
+	if args.quick:
+		args.natoms = [50]
+		args.nframes = [200, 500]
+
+	results = []
+	with tempfile.TemporaryDirectory() as tmpdir:
+		directory = args.dir or tmpdir
+		for natoms in args.natoms:
+			for nframes in args.nframes:
+				fn = os.path.join(directory, "brownian_{}x{}{}.xyz".format(natoms, nframes, "_pbc" if args.pbc else ""))
+				if not os.path.exists(fn):
+					write_trajectory(fn, natoms, nframes, args.pbc)
+				for engine in args.engines:
+					if engine == "direct" and nframes > DIRECT_MAX_FRAMES:
+						continue
+					res = run_stages(fn, natoms, nframes, engine, args.pbc, args.workers, args.precision)
+					results.append(res)
+					print("{:>8} atoms {:>8} frames {:>9}: parse {:.3f} s  unwrap {:.3f} s  msd {:.3f} s  fit {:.4f} s  "
+						"D = {:.4f} +- {:.4f} {}".format(natoms, nframes, engine, res["times"]["parse"], res["times"]["unwrap"],
+						res["times"]["msd"], res["times"]["fit"], res["diffusion"], res["diffusion_error"], "ok" if res["ok"] else "FAILED"))
+					sys.stdout.flush()
+
+	with open(args.output, "w") as fout:
+		json.dump({"diffusion_true": DIFFUSION, "time_step": TIME_STEP, "box_length": BOX_LENGTH, "results": results}, fout, indent=1)
+	if args.plot:
+		plot_results(results, args.plot)
+
+	return 0 if all(res["ok"] for res in results) else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,311 @@
+#command line interface - argument parser of application and headless batch mode which
+#runs MSD/diffusion pipeline without importing PyQt5 or matplotlib Qt backend
+#
+#example:
+# python MSDiff.py --headless traj.xyz --pbc --tstart 100 --tend 5000 -o msd.txt
+
+#argparse library - used for using command line arguments
+import argparse
+
+#os and system libraries - used for profile file names and error output
+import os
+import sys
+
+#time library - used for polling in follow mode
+import time
+
+#compute core
+from msdengine import ENGINES
+from xyzreader import PRECISIONS
+from msdpipeline import run_msd, parse_group, parse_frames_slice
+from msdfit import select_window, fit_power_law, fit_diffusion, bootstrap_diffusion, detect_linear_window, origin_diffusion_error, \
+	replica_diffusion_error
+from msdensemble import expand_replicas, run_ensemble
+from msdexport import write_msd, export_atom_msd, export_unwrapped
+from trajcache import TrajectoryCache
+from msdfollow import MSDFollower
+from msdprofile import RunStats
+
+
+#-------------------------------------------------
+# command line arguments of GUI and headless mode |
+#-------------------------------------------------
+def build_parser():
+
+	parser = argparse.ArgumentParser(description="App for calculation of MSD and diffusion coefficient.")
+	parser.add_argument("-m","--muted",help="app doest not show warnings (decrease verbosity)",
+				action="store_true")
+	parser.add_argument("--no-cache",help="app does not store parsed trajectories in binary cache",
+				action="store_true")
+	parser.add_argument("--headless",help="run calculation without GUI, requires trajectory file",
+				action="store_true")
+	parser.add_argument("trajectory",nargs="?",help="input .xyz file (headless mode)")
+	parser.add_argument("--replicas",nargs="+",metavar="FILE",
+				help="ensemble mode - MSD is averaged over replica trajectories given as files or glob "
+				"patterns (e.g. 'run*/traj.xyz'), --workers replicas are processed concurrently")
+	parser.add_argument("-o","--output",help="output file with MSD values and metadata (headless mode), format from "
+				"extension: .npy (with .json sidecar), .npz, .h5/.hdf5 (needs h5py) or text")
+	parser.add_argument("--atom-msd",metavar="FILE",
+				help="export MSD of every atom as matrix (atoms x lags) to .npy, .npz, .h5 or text file (headless mode)")
+	parser.add_argument("--unwrapped",metavar="FILE",
+				help="export unwrapped trajectory (frames x atoms x 3) to .npy, .npz or .h5 file (headless mode)")
+	parser.add_argument("--pbc",help="trajectory uses periodic boundary conditions (per-frame Lattice= cells of extended XYZ are used if present)",
+				action="store_true")
+	parser.add_argument("--box-min",nargs=3,type=float,metavar=("X","Y","Z"),
+				help="minimum of simulation box, detected from coordinates if not specified")
+	parser.add_argument("--box-max",nargs=3,type=float,metavar=("X","Y","Z"),
+				help="maximum of simulation box, detected from coordinates if not specified")
+	parser.add_argument("--engine",choices=sorted(ENGINES),default="fft",
+				help="MSD engine (default fft)")
+	parser.add_argument("--frames",metavar="START:STOP:STEP",
+				help="MSD is calculated only from selected frames, e.g. 5000:6000 or ::10 (every 10th frame)")
+	parser.add_argument("--stride",type=int,metavar="K",
+				help="only every K-th frame is loaded (combined with --frames), e.g. for quick preview")
+	parser.add_argument("--origins",type=int,metavar="S",
+				help="only every S-th time origin is used (direct and multitau engines), statistical error "
+				"of subsampling is reported")
+	parser.add_argument("--max-lag",type=int,metavar="N",
+				help="MSD is calculated only for lags up to N frames")
+	parser.add_argument("--log-lags",type=int,metavar="N",
+				help="MSD is calculated only for N log-spaced lags (use with multitau or direct engine)")
+	parser.add_argument("--workers",type=int,default=1,metavar="N",
+				help="number of worker processes for parsing and MSD calculation (default 1)")
+	parser.add_argument("--precision",choices=sorted(PRECISIONS),default="double",
+				help="storage precision of coordinates, single halves memory of trajectory (MSD is always "
+				"accumulated in double precision, default double)")
+	parser.add_argument("--memory-budget",type=float,metavar="MB",
+				help="out-of-core mode - trajectory is streamed from binary cache file and MSD is calculated "
+				"in chunks of atoms which fit into given memory per worker process")
+	parser.add_argument("--species",help="MSD and diffusion are calculated also for every species (atom label)",
+				action="store_true")
+	parser.add_argument("--group",action="append",default=[],metavar="NAME:INDICES",
+				help="MSD and diffusion are calculated also for group of atoms, indices from 0 with ranges "
+				"(e.g. solvent:0-99,200), can be repeated")
+	parser.add_argument("--error-blocks",type=int,metavar="N",
+				help="statistical error of diffusion by bootstrap over N blocks of atoms with separate MSD")
+	parser.add_argument("--profile",metavar="FILE",
+				help="write wall time, CPU time, peak memory and throughput of pipeline stages to JSON file")
+	parser.add_argument("--cprofile",action="append",default=[],metavar="STAGE",
+				help="profile stage (load, msd, fit) by cProfile, statistics are written to <profile>.<STAGE>.prof, "
+				"can be repeated")
+	parser.add_argument("--follow",type=float,metavar="SECONDS",
+				help="follow trajectory which is still being written, new frames are checked every SECONDS "
+				"(trajectory is parsed directly, without cache)")
+	parser.add_argument("--tstart",type=float,help="beginning of time interval for diffusion calculation")
+	parser.add_argument("--tend",type=float,help="end of time interval for diffusion calculation")
+	parser.add_argument("--auto-window",help="time interval for diffusion calculation is detected automatically "
+				"(log-log slope of MSD closest to 1), overrides --tstart/--tend",action="store_true")
+	return parser
+
+
+#memory budget in MB from command line in bytes, None = trajectory is held in memory
+def memory_bytes(budget):
+	if budget is None or budget <= 0:
+		return None
+	return budget*1024**2
+
+
+#frames selected by --frames and --stride (every K-th of selected frames), None = all frames
+def frame_selection(args):
+
+	frames = parse_frames_slice(args.frames) if args.frames else None
+	if args.stride and args.stride > 1:
+		frames = frames or slice(None)
+		frames = slice(frames.start, frames.stop, (frames.step or 1)*args.stride)
+	return frames
+
+
+#----------------------------------------------------------------------
+# headless batch mode - MSD is written to output, diffusion to stdout |
+#----------------------------------------------------------------------
+def run(args):
+
+	if args.trajectory is None and not args.replicas:
+		print("error: headless mode requires trajectory file", file=sys.stderr)
+		return 2
+	if args.replicas and (args.follow is not None or args.error_blocks):
+		print("error: follow mode and --error-blocks can not be used with replicas (error of diffusion is estimated "
+			"from replicas)", file=sys.stderr)
+		return 2
+	if (args.replicas or args.follow is not None) and (args.atom_msd or args.unwrapped):
+		print("error: per-atom MSD and unwrapped trajectory can be exported only from one trajectory", file=sys.stderr)
+		return 2
+	if args.follow is not None:
+		if args.species or args.group or args.error_blocks or args.origins:
+			print("error: MSD of species/groups and error of diffusion are not available in follow mode", file=sys.stderr)
+			return 2
+		if args.engine != "fft" or args.workers != 1 or args.precision != "double" or args.frames or args.stride \
+				or args.memory_budget is not None:
+			print("error: --engine, --workers, --precision, --frames, --stride and --memory-budget are not available in "
+				"follow mode (all appended frames are accumulated in double precision)", file=sys.stderr)
+			return 2
+		return follow(args)
+
+	cache = None if args.no_cache else TrajectoryCache()
+	stats = RunStats(args.cprofile, os.path.splitext(args.profile)[0] if args.profile else "msdiff")
+	try:
+		groups = dict(parse_group(text) for text in args.group)
+		frames = frame_selection(args)
+		if args.origins is not None and args.origins < 1:
+			raise ValueError("Spacing of time origins has to be at least 1")
+		options = dict(pbc=args.pbc, boxmin=args.box_min, boxmax=args.box_max, engine=args.engine, cache=cache,
+			memory=memory_bytes(args.memory_budget), max_lag=args.max_lag, nlog=args.log_lags, species=args.species,
+			groups=groups, frames=frames, origins=args.origins, precision=args.precision)
+		if args.replicas:
+			fns = expand_replicas(args.replicas)
+			with stats.stage("ensemble") as record:
+				result = run_ensemble(fns, workers=args.workers, **options)
+				record["replicas"] = len(fns)
+		else:
+			result = run_msd(args.trajectory, workers=args.workers, blocks=args.error_blocks, stats=stats, **options)
+
+		#per-atom MSD and unwrapped trajectory are written chunk by chunk into output files
+		load = dict(pbc=args.pbc, boxmin=args.box_min, boxmax=args.box_max, cache=cache, memory=memory_bytes(args.memory_budget),
+			frames=frames, precision=args.precision)
+		if args.atom_msd:
+			with stats.stage("export"):
+				export_atom_msd(args.atom_msd, args.trajectory, engine=args.engine, max_lag=args.max_lag, nlog=args.log_lags, **load)
+		if args.unwrapped:
+			with stats.stage("export"):
+				export_unwrapped(args.unwrapped, args.trajectory, **load)
+	except (OSError,ValueError) as e:
+		print("error: {}".format(e), file=sys.stderr)
+		return 1
+
+	with stats.stage("fit"):
+		status = report(result, args)
+	if args.profile:
+		stats.write(args.profile)
+	return status
+
+
+#--------------------------------------------------------------------------------------------
+# diffusion calculation and MSD output - MSD of species/groups (and replica-to-replica std of |
+# ensemble) are additional columns, fit window and diffusion are written to metadata        |
+#--------------------------------------------------------------------------------------------
+def report(result, args):
+
+	fit = {}
+	status = fit_report(result, args, fit)
+	if args.output:
+		try:
+			write_msd(args.output, result, fit)
+		except (OSError,ValueError) as e:
+			print("error: cant write output: {}".format(e), file=sys.stderr)
+			return 1
+	return status
+
+
+#diffusion calculation in user-specified/default/detected time range, fit window and diffusion
+#of all atoms are stored to fit dictionary
+def fit_report(result, args, fit):
+
+	#time range of diffusive regime of all atoms is used also for species/groups
+	tstart, tend = args.tstart, args.tend
+	if args.auto_window:
+		try:
+			tstart, tend, _, _ = detect_linear_window(result.time, result.msd)
+		except ValueError as e:
+			print("error: cant detect time range for diffusion: {}".format(e), file=sys.stderr)
+			return 1
+
+	diffusion = []
+	for name, msd in zip(["all"] + result.groups, [result.msd] + list(result.group_msd if result.groups else [])):
+		diff_x, diff_y = select_window(result.time, msd, tstart, tend)
+		try:
+			k, q, a = fit_power_law(diff_x, diff_y)
+			d = fit_diffusion(diff_x, diff_y)
+		except (RuntimeError,ValueError,TypeError) as e:
+			print("error: cant calculate diffusion of {} on specified time range: {}".format(name, e), file=sys.stderr)
+			return 1
+		diffusion.append((name, a, d))
+
+	#error of diffusion of all atoms caused by subsampling of time origins
+	origin_error = None
+	if result.origin_msd is not None:
+		diff_x, half_y = select_window(result.time, result.origin_msd.T, tstart, tend)
+		try:
+			origin_error = origin_diffusion_error(diff_x, half_y.T)
+		except ValueError as e:
+			print("error: cant estimate error of subsampled origins: {}".format(e), file=sys.stderr)
+			return 1
+
+	#error of ensemble diffusion from spread of diffusion of replicas
+	replica_error = None
+	if result.nreplicas is not None and result.nreplicas > 1:
+		diff_x, replica_y = select_window(result.replica_time, result.replica_msd.T, tstart, tend)
+		try:
+			replica_error = replica_diffusion_error(diff_x, replica_y.T)
+		except ValueError as e:
+			print("error: cant estimate error of diffusion from replicas: {}".format(e), file=sys.stderr)
+			return 1
+
+	#bootstrap error of diffusion of all atoms from MSD of blocks of atoms
+	error = None
+	if result.block_msd is not None:
+		diff_x, block_y = select_window(result.time, result.block_msd.T, tstart, tend)
+		try:
+			_, error = bootstrap_diffusion(diff_x, block_y.T, result.block_sizes)
+		except ValueError as e:
+			print("error: cant estimate error of diffusion: {}".format(e), file=sys.stderr)
+			return 1
+
+	#fit window and diffusion for metadata of output, None = no limit of window
+	fit.update(tstart=tstart, tend=tend, a=float(diffusion[0][1]), diffusion=float(diffusion[0][2]))
+	for key, value in (("diffusion_error", error), ("diffusion_origin_error", origin_error), ("diffusion_replica_error", replica_error)):
+		if value is not None:
+			fit[key] = float(value)
+	if result.groups:
+		fit["group_diffusion"] = {name: float(d) for name, _, d in diffusion[1:]}
+
+	if result.nreplicas is not None:
+		print("replicas = {}".format(result.nreplicas))
+	if args.pbc:
+		print("box min = {} {} {}".format(*result.boxmin))
+		print("box max = {} {} {}".format(*result.boxmax))
+	if args.auto_window:
+		print("tstart = {}".format(tstart))
+		print("tend = {}".format(tend))
+	for ig, (name, a, d) in enumerate(diffusion):
+		suffix = "" if ig == 0 else " [{}]".format(name)
+		print("a{} = {}".format(suffix, a))
+		print("Diffusion{} = {}".format(suffix, d))
+		if ig == 0 and error is not None:
+			print("Diffusion error = {}".format(error))
+		if ig == 0 and origin_error is not None:
+			print("Diffusion origin error = {}".format(origin_error))
+		if ig == 0 and replica_error is not None:
+			print("Diffusion replica error = {}".format(replica_error))
+	return 0
+
+
+#--------------------------------------------------------------------------------------
+# follow mode - trajectory is polled until interrupted (Ctrl+C), MSD and diffusion are |
+# reported after every update with new frames                                           |
+#--------------------------------------------------------------------------------------
+def follow(args):
+
+	follower = MSDFollower(args.trajectory, args.pbc, args.box_min, args.box_max, args.max_lag, args.log_lags)
+	try:
+		while True:
+			try:
+				result = follower.poll()
+			except (OSError,ValueError) as e:
+				print("error: {}".format(e), file=sys.stderr)
+				return 1
+			if result is not None:
+				print("frames = {}".format(result.nframes))
+				report(result, args)
+				sys.stdout.flush()
+			time.sleep(args.follow)
+	except KeyboardInterrupt:
+		return 0
+
+
+def main(argv=None):
+	args = build_parser().parse_args(argv)
+	return run(args)
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,371 @@
+#MSD engines - compute time-origin averaged Mean-Squared Displacement from coordinates
+#stored in numpy array with shape (natoms, nt, 3)
+# "direct" = reference engine, explicit sum over all time origins, O(natoms*nt^2)
+# "fft"    = Wiener-Khinchin engine, autocorrelation computed with FFT, O(natoms*nt*log(nt))
+# "multitau" = multiple-tau scheme, origins of lag tau are spaced by max(1, tau//MULTITAU_POINTS),
+#              so number of origins decreases with lag, O(natoms*nt*L) for L lags at worst
+#
+#every engine returns per-atom MSD with shape (natoms, len(lags)) for selected lags from
+#0 ... nt-2 (all lags by default), new engines are plugged in by adding them to ENGINES dictionary
+#
+#time origins can be subsampled (every S-th origin) with direct and multitau engines, origins
+#are then split into two interleaved halves whose MSD difference estimates statistical error
+#of subsampling
+#
+#MSD of groups of atoms (e.g. species) is obtained in the same pass - per-atom MSD of every
+#chunk is reduced with membership weights of groups instead of plain sum over atoms
+#
+#atoms are independent, so chunks of atoms can be processed by multiple worker processes,
+#size of chunks can be derived from memory budget - coordinates stored in memory-mapped file
+#are then read chunk by chunk and the whole trajectory never has to fit into memory
+
+#time library - used for timing of parts of chunk calculation
+import time
+
+#numpy library
+import numpy as np
+
+#periodic boundary conditions are removed per chunk of atoms
+from pbc import unwrap
+
+
+#number of atoms processed at once - bounds memory of temporary arrays
+CHUNK_ATOMS = 64
+
+#number of frames copied at once from memory-mapped file into chunk of atoms
+FRAME_BLOCK = 1024
+
+#multiple-tau engine - lags up to MULTITAU_POINTS use every time origin
+MULTITAU_POINTS = 16
+
+
+#--------------------------------------------------------------------------------
+# selected lag times - all lags up to max_lag, or nlog log-spaced lags (+ lag 0) |
+#--------------------------------------------------------------------------------
+def select_lags(nt, max_lag=None, nlog=None):
+
+	last = nt - 2 if max_lag is None else max(0, min(max_lag, nt-2))
+	if nlog is None:
+		return np.arange(last+1)
+	lags = np.unique(np.round(np.logspace(0, np.log10(max(last, 1)), nlog)).astype(np.int64))
+	return np.concatenate(([0], lags[lags <= last]))
+
+
+#MSD of lags averaged over time origins t0 = offset, offset+stride(lag), offset+2*stride(lag), ...
+#(zero for lags without any origin)
+def lag_msd_atoms(r, lags, stride, offset=lambda it: 0):
+
+	natoms, nt, _ = r.shape
+	msd = np.zeros((natoms, len(lags)))
+	for il, it in enumerate(lags):
+		step = stride(it)
+		t0 = offset(it)
+		dr = r[:, it+t0::step, :] - r[:, t0:nt-it:step, :]
+		if dr.shape[1] > 0:
+			msd[:, il] = np.einsum("ijk,ijk->i", dr, dr)/float(dr.shape[1])
+	return msd
+
+
+#---------------------------------------------------------------------
+# reference engine - direct sum over time origins for every lag time |
+#---------------------------------------------------------------------
+def msd_direct_atoms(r, lags=None):
+
+	if lags is None:
+		lags = np.arange(r.shape[1]-1)
+	return lag_msd_atoms(r, lags, lambda it: 1)
+
+
+#----------------------------------------------------------------------------------------
+# multiple-tau engine - lag tau uses origins spaced by tau//MULTITAU_POINTS, statistics |
+# of long lags is dominated by correlated origins anyway and their cost drops with lag  |
+#----------------------------------------------------------------------------------------
+def msd_multitau_atoms(r, lags=None):
+
+	if lags is None:
+		lags = np.arange(r.shape[1]-1)
+	return lag_msd_atoms(r, lags, lambda it: max(1, it//MULTITAU_POINTS))
+
+
+#--------------------------------------------------------------------------
+# FFT engine - MSD(m) = S1(m) - 2*S2(m), where S2 is position autocorrelation |
+#--------------------------------------------------------------------------
+def msd_fft_atoms(r, lags=None):
+
+	natoms, nt, _ = r.shape
+
+	#MSD does not depend on origin of coordinates, centering reduces cancellation error
+	r = r - r.mean(axis=1, keepdims=True)
+
+	#S2 - autocorrelation summed over dimensions, zero padding avoids circular correlation
+	nfft = 1 << (2*nt - 1).bit_length()
+	f = np.fft.rfft(r, n=nfft, axis=1)
+	psd = (f.real**2 + f.imag**2).sum(axis=2)
+	norm = nt - np.arange(nt, dtype=np.float64)
+	s2 = np.fft.irfft(psd, n=nfft, axis=1)[:, :nt]/norm
+
+	#S1 - recursion Q(m) = Q(m-1) - D(m-1) - D(nt-m) written with cumulative sum
+	d = (r**2).sum(axis=2)
+	q = 2.0*d.sum(axis=1)
+	dq = np.zeros((natoms, nt))
+	dq[:, 1:] = d[:, :-1] + d[:, :0:-1]
+	s1 = (q[:, None] - np.cumsum(dq, axis=1))/norm
+
+	#MSD at lag 0 is exactly zero, FFT round-off would leave tiny (also negative) values
+	msd = (s1 - 2.0*s2)[:, :nt-1]
+	msd[:, 0] = 0.0
+	if lags is not None:
+		msd = msd[:, lags]
+	return msd
+
+
+#available engines
+ENGINES = {
+	"direct": msd_direct_atoms,
+	"fft": msd_fft_atoms,
+	"multitau": msd_multitau_atoms,
+}
+
+#spacing of time origins of engines which support subsampling of origins (every S-th origin)
+ORIGIN_STRIDES = {
+	"direct": lambda origins: (lambda it: origins),
+	"multitau": lambda origins: (lambda it: max(origins, it//MULTITAU_POINTS)),
+}
+
+
+#---------------------------------------------------------------------------------------------
+# MSD of subsampled time origins split into two interleaved halves (even and odd origins), |
+# returns array with shape (2, natoms, len(lags))                                            |
+#---------------------------------------------------------------------------------------------
+def origin_halves_atoms(r, lags, engine, origins):
+
+	if lags is None:
+		lags = np.arange(r.shape[1]-1)
+	stride = ORIGIN_STRIDES[engine](origins)
+	return np.array([lag_msd_atoms(r, lags, lambda it: 2*stride(it)),
+		lag_msd_atoms(r, lags, lambda it: 2*stride(it), stride)])
+
+
+#-------------------------------------------------------------------------------------------
+# MSD of all subsampled origins and its standard error from halves (shape (2, ..., nlags)), |
+# halves are weighted by number of their origins, error is unknown (nan) for lags with   |
+# origins in one half only                                                               |
+#-------------------------------------------------------------------------------------------
+def combine_halves(halves, nt, lags, engine, origins):
+
+	stride = ORIGIN_STRIDES[engine](origins)
+	steps = np.array([stride(it) for it in lags])
+	last = nt - 1 - np.asarray(lags)
+	counts_even = last//(2*steps) + 1
+	counts_odd = np.where(last >= steps, (last - steps)//(2*steps) + 1, 0)
+	msd = (counts_even*halves[0] + counts_odd*halves[1])/(counts_even + counts_odd)
+	error = np.where(counts_odd > 0, np.abs(halves[0] - halves[1])/2.0, np.nan)
+	return msd, error
+
+
+#approximate peak memory of MSD calculation per atom (chunk copy, unwrapping and FFT buffers)
+def atom_bytes(nt, engine):
+
+	nbytes = 128*nt
+	if engine == "fft":
+		nbytes += 64*(1 << (2*nt - 1).bit_length())
+	return nbytes
+
+
+#number of atoms in chunk, memory budget in bytes is per process
+def chunk_atoms(nt, engine, memory=None):
+
+	if memory is None:
+		return CHUNK_ATOMS
+	n = int(memory//atom_bytes(nt, engine))
+	if n < 1:
+		raise ValueError("Memory budget {:.1f} MB is too small, MSD of one atom needs {:.1f} MB".format(memory/1024**2, atom_bytes(nt, engine)/1024**2))
+	return n
+
+
+#------------------------------------------------------------------------------------------------
+# copy of atoms ia ... ia+n-1, coordinates are read in blocks of frames - in memory-mapped file |
+# frame-major layout, so every block touches only a small window of the file                   |
+# copy is always double precision - unwrapping and MSD accumulation of coordinates stored in   |
+# single precision do not lose more than rounding of stored coordinates                        |
+#------------------------------------------------------------------------------------------------
+def load_chunk(r, ia, n):
+
+	natoms, nt, _ = r.shape
+	chunk = np.empty((min(n, natoms-ia), nt, 3), dtype=np.float64)
+	for it in range(0, nt, FRAME_BLOCK):
+		chunk[:, it:it+FRAME_BLOCK] = r[ia:ia+n, it:it+FRAME_BLOCK]
+	return chunk
+
+
+#MSD summed over atoms of one chunk, periodic boundary conditions are removed per chunk,
+#chunk is always copied to the same memory layout so the result does not depend on source of data,
+#weights with shape (ngroups, atoms of chunk) give sums over groups instead of all atoms,
+#seconds spent in copy, unwrapping and engine are added to timing dictionary if given,
+#with origins (every origins-th time origin) result has leading axis of two halves of origins
+def chunk_msd(r, ia, engine, boxlen=None, n=CHUNK_ATOMS, lags=None, weights=None, timing=None, origins=None):
+
+	start = time.perf_counter()
+	chunk = load_chunk(r, ia, n)
+	copied = time.perf_counter()
+	if boxlen is not None:
+		chunk = unwrap(chunk, boxlen)
+	unwrapped = time.perf_counter()
+	if origins is None:
+		msd = ENGINES[engine](chunk, lags)
+	else:
+		msd = origin_halves_atoms(chunk, lags, engine, origins)
+	msd = msd.sum(axis=-2) if weights is None else weights @ msd
+	if timing is not None:
+		add_timing(timing, {"copy": copied - start, "unwrap": unwrapped - copied, "engine": time.perf_counter() - unwrapped})
+	return msd
+
+
+#unwrapped copy of all atoms (natoms, nt, 3) in double precision, unwrapped chunk by chunk of
+#atoms, so temporary arrays of unwrapping do not grow with size of system (see msdmemo)
+def unwrap_atoms(r, boxlen, n=CHUNK_ATOMS):
+
+	out = np.empty(r.shape, dtype=np.float64)
+	for ia in range(0, r.shape[0], n):
+		out[ia:ia+n] = unwrap(load_chunk(r, ia, n), boxlen)
+	return out
+
+
+#sum of timing dictionaries
+def add_timing(timing, other):
+	for key, seconds in other.items():
+		timing[key] = timing.get(key, 0.0) + seconds
+
+
+#---------------------------------------------------------------------------------------------
+# coordinates shared with worker processes - memory-mapped file (e.g. trajectory cache) is  |
+# opened by workers directly, other arrays are copied once into shared memory block         |
+#---------------------------------------------------------------------------------------------
+def share_array(r):
+
+	from multiprocessing import shared_memory
+	root = r
+	while isinstance(root.base, np.ndarray):
+		root = root.base
+	if isinstance(root, np.memmap) and root.filename is not None and root.flags.c_contiguous:
+		start = r.__array_interface__["data"][0] - root.__array_interface__["data"][0]
+		spec = ("memmap", root.filename, root.offset, root.shape, root.dtype.str, start, r.shape, r.strides)
+		return spec, None
+
+	shm = shared_memory.SharedMemory(create=True, size=max(1, r.nbytes))
+	np.ndarray(r.shape, dtype=r.dtype, buffer=shm.buf)[...] = r
+	return ("shm", shm.name, r.shape, r.dtype.str), shm
+
+
+#array described by share_array opened in worker process
+def open_shared(spec):
+
+	if spec[0] == "memmap":
+		_, filename, offset, shape, dtype, start, view_shape, view_strides = spec
+		root = np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+		return np.ndarray(view_shape, dtype=dtype, buffer=root, offset=start, strides=view_strides), root
+
+	from multiprocessing import shared_memory
+	_, name, shape, dtype = spec
+	shm = shared_memory.SharedMemory(name=name)
+	return np.ndarray(shape, dtype=dtype, buffer=shm.buf), shm
+
+
+#coordinates opened once in every worker process, box (per-frame cells can be large) is sent once too
+_worker_r = None
+_worker_handle = None
+_worker_boxlen = None
+
+def _worker_init(spec, boxlen):
+	global _worker_r, _worker_handle, _worker_boxlen
+	_worker_r, _worker_handle = open_shared(spec)
+	_worker_boxlen = boxlen
+
+def _worker_chunk(ia, engine, n, lags, weights, origins):
+	timing = {}
+	return chunk_msd(_worker_r, ia, engine, _worker_boxlen, n, lags, weights, timing, origins), timing
+
+
+#---------------------------------------------------------------------------------------------
+# MSD averaged over atoms, progress(fraction) callback can cancel calculation by False       |
+# atoms are split into chunks of fixed size which are processed by pool of worker processes, |
+# partial sums are reduced in chunk order so the result does not depend on number of workers, |
+# memory (bytes per process) sets size of chunks, otherwise chunks have CHUNK_ATOMS atoms,    |
+# lags = selected lag times (see select_lags), all lags 0 ... nt-2 by default,               |
+# groups = membership matrix (ngroups, natoms) - MSD of every group is returned as one row,  |
+# timing = dictionary which gets seconds of copy/unwrap/engine summed over all chunks,       |
+# origins = only every origins-th time origin is used, result has leading axis of two       |
+# interleaved halves of origins (see combine_halves)                                        |
+#---------------------------------------------------------------------------------------------
+def compute_msd(r, engine="fft", progress=None, boxlen=None, workers=1, memory=None, lags=None, groups=None, timing=None,
+		origins=None):
+
+	if engine not in ENGINES:
+		raise ValueError("Unknown MSD engine '{}', available engines: {}".format(engine, ", ".join(sorted(ENGINES))))
+	if origins is not None and engine not in ORIGIN_STRIDES:
+		raise ValueError("Subsampling of time origins needs one of engines: {}".format(", ".join(sorted(ORIGIN_STRIDES))))
+
+	natoms, nt, _ = r.shape
+	if groups is not None:
+		groups = np.asarray(groups, dtype=np.float64)
+		if groups.shape[1] != natoms:
+			raise ValueError("Groups of atoms have {} members, trajectory has {} atoms".format(groups.shape[1], natoms))
+		if not groups.sum(axis=1).all():
+			raise ValueError("Every group of atoms has to contain at least one atom")
+	weights = lambda ia: None if groups is None else groups[:, ia:ia+n]
+
+	n = chunk_atoms(nt, engine, memory)
+	starts = list(range(0, natoms, n))
+	partial = [None]*len(starts)
+
+	if workers <= 1 or len(starts) == 1:
+		for ic, ia in enumerate(starts):
+			partial[ic] = chunk_msd(r, ia, engine, boxlen, n, lags, weights(ia), timing, origins)
+			if progress is not None and progress((ic+1)/len(starts)) is False:
+				return None
+	else:
+		#process pool is imported only for calculation in multiple processes (startup time)
+		from concurrent.futures import ProcessPoolExecutor, as_completed
+		spec, shm = share_array(r)
+		try:
+			with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init, initargs=(spec, boxlen)) as pool:
+				futures = {pool.submit(_worker_chunk, ia, engine, n, lags, weights(ia), origins): ic for ic, ia in enumerate(starts)}
+				for done, future in enumerate(as_completed(futures)):
+					partial[futures[future]], chunk_timing = future.result()
+					if timing is not None:
+						add_timing(timing, chunk_timing)
+					if progress is not None and progress((done+1)/len(starts)) is False:
+						pool.shutdown(cancel_futures=True)
+						return None
+		finally:
+			if shm is not None:
+				shm.close()
+				shm.unlink()
+
+	msd = np.zeros(partial[0].shape)
+	for chunk_sum in partial:
+		msd += chunk_sum
+	if groups is None:
+		return msd/float(natoms)
+	return msd/groups.sum(axis=1)[:, None]
+
+
+#---------------------------------------------------------------------------------------------
+# per-atom MSD written into out (shape (natoms, len(lags)), e.g. memory-mapped .npy file or |
+# HDF5 dataset) chunk by chunk of atoms, so the matrix never has to fit into memory,         |
+# progress(fraction) callback can cancel calculation by False - returns False if cancelled   |
+#---------------------------------------------------------------------------------------------
+def atom_msd(r, out, engine="fft", progress=None, boxlen=None, memory=None, lags=None):
+
+	if engine not in ENGINES:
+		raise ValueError("Unknown MSD engine '{}', available engines: {}".format(engine, ", ".join(sorted(ENGINES))))
+	natoms, nt, _ = r.shape
+	n = chunk_atoms(nt, engine, memory)
+	for ia in range(0, natoms, n):
+		chunk = load_chunk(r, ia, n)
+		if boxlen is not None:
+			chunk = unwrap(chunk, boxlen)
+		out[ia:ia+len(chunk)] = ENGINES[engine](chunk, lags)
+		if progress is not None and progress(min(ia+n, natoms)/float(natoms)) is False:
+			return False
+	return True
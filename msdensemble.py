@@ -0,0 +1,145 @@
+#ensemble mode - MSD of many independent replica trajectories (e.g. 20-100 runs of one state
+#point) is calculated concurrently by bounded pool of worker processes and averaged over replicas
+#
+#every replica is loaded only inside its worker process and at most `workers` replicas are
+#processed at once, main process holds only running accumulators - mean and sum of squared
+#deviations of MSD (Welford update), so memory does not grow with number of replicas
+#
+#MSD of every replica is also kept at REPLICA_POINTS log-spaced lags, diffusion of every
+#replica can be fitted from them on any time range later and spread of replica diffusion
+#coefficients gives standard error of ensemble diffusion
+
+#glob library - used for patterns of replica files
+import glob
+
+#numpy library
+import numpy as np
+
+#MSD of one replica
+from msdpipeline import MSDResult, run_msd
+
+
+#number of log-spaced lags at which MSD of every replica is kept for error of diffusion
+REPLICA_POINTS = 256
+
+
+#replica files from file names and glob patterns (e.g. "run*/traj.xyz") in given order, duplicates are removed
+def expand_replicas(patterns):
+
+	fns = []
+	for pattern in patterns:
+		for fn in sorted(glob.glob(pattern)) or [pattern]:
+			if fn not in fns:
+				fns.append(fn)
+	if not fns:
+		raise ValueError("Ensemble mode needs at least one replica trajectory")
+	return fns
+
+
+#indices of lag 0 and of REPLICA_POINTS log-spaced lags out of nlags
+def replica_points(nlags):
+
+	if nlags < 2:
+		return np.zeros(1, dtype=np.int64)
+	points = np.unique(np.round(np.geomspace(1, nlags-1, REPLICA_POINTS)).astype(np.int64))
+	return np.concatenate(([0], points))
+
+
+#------------------------------------------------------------------------------------------
+# running average of MSD over replicas - MSD of all atoms and of species/groups are rows |
+# of accumulators, replicas have to share time axis and groups                           |
+#------------------------------------------------------------------------------------------
+class EnsembleAccumulator:
+
+	def __init__(self):
+		self.count = 0
+		self.first = None
+		self.first_fn = None
+		self.mean = None
+		self.m2 = None
+		self.points = None
+		self.replica_msd = []
+
+	def add(self, fn, result):
+
+		rows = np.vstack(([result.msd], result.group_msd)) if result.groups else np.asarray(result.msd)[None]
+		if self.first is None:
+			self.first = result
+			self.first_fn = fn
+			self.mean = np.zeros(rows.shape)
+			self.m2 = np.zeros(rows.shape)
+			self.points = replica_points(len(result.time))
+		elif len(result.time) != len(self.first.time) or not np.allclose(result.time, self.first.time):
+			raise ValueError("Replica {} has different time axis (frames or time step) than replica {}".format(fn, self.first_fn))
+		elif result.groups != self.first.groups:
+			raise ValueError("Replica {} has different species/groups than replica {}".format(fn, self.first_fn))
+
+		#Welford update of mean and sum of squared deviations
+		self.count += 1
+		delta = rows - self.mean
+		self.mean += delta/self.count
+		self.m2 += delta*(rows - self.mean)
+		self.replica_msd.append(np.asarray(result.msd)[self.points])
+
+	#----------------------------------------------------------------------------------------
+	# ensemble MSD with replica-to-replica standard deviation (nan for one replica), box    |
+	# bounds are those of the first replica                                                 |
+	#----------------------------------------------------------------------------------------
+	def result(self):
+
+		first = self.first
+		std = np.sqrt(self.m2[0]/(self.count - 1)) if self.count > 1 else np.full(len(first.time), np.nan)
+		return MSDResult(first.time, self.mean[0], first.natoms, first.nframes, first.engine, first.pbc, first.boxmin, first.boxmax,
+			first.groups, self.mean[1:] if first.groups else None, nreplicas=self.count, replica_std=std,
+			replica_time=np.asarray(first.time)[self.points], replica_msd=np.array(self.replica_msd))
+
+
+#--------------------------------------------------------------------------------------------
+# ensemble-averaged MSD of replica files, kwargs are settings of run_msd (pbc, engine, ...), |
+# workers > 1 processes replicas concurrently (every replica by one process), progress is  |
+# reported per replica and can cancel calculation (returns None)                           |
+#--------------------------------------------------------------------------------------------
+def run_ensemble(fns, progress=None, workers=1, **kwargs):
+
+	accumulator = EnsembleAccumulator()
+
+	def add(fn, result):
+		accumulator.add(fn, result)
+		return progress is None or progress(accumulator.count/float(len(fns)))
+
+	if workers <= 1:
+		for fn in fns:
+			result = run_replica(fn, **kwargs)
+			if not add(fn, result):
+				return None
+	else:
+		#bounded number of replicas in flight, next replica is submitted when one finishes,
+		#process pool is imported only here (startup time)
+		from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			remaining = iter(fns)
+			pending = {pool.submit(run_replica, fn, **kwargs): fn for _, fn in zip(range(workers), remaining)}
+			try:
+				while pending:
+					finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+					for future in finished:
+						fn = pending.pop(future)
+						if not add(fn, future.result()):
+							return None
+						fn = next(remaining, None)
+						if fn is not None:
+							pending[pool.submit(run_replica, fn, **kwargs)] = fn
+			finally:
+				for future in pending:
+					future.cancel()
+
+	return accumulator.result()
+
+
+#MSD of one replica calculated by one process, errors name the replica file
+def run_replica(fn, **kwargs):
+
+	try:
+		return run_msd(fn, **kwargs)
+	except ValueError as e:
+		raise ValueError("Replica {}: {}".format(fn, e))
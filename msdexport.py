@@ -0,0 +1,224 @@
+#export of results - MSD table, per-atom MSD matrix and unwrapped trajectory are written with
+#bulk array I/O, format is chosen by extension of output file:
+# .npy       = binary array which can be memory-mapped (np.load(fn, mmap_mode="r")), metadata,
+#              column names and small arrays (times, atom types) are in sidecar <file>.json
+# .npz       = arrays and metadata (JSON string "metadata") in one uncompressed archive
+# .h5, .hdf5 = HDF5 datasets with metadata in attributes (needs h5py package), datasets are
+#              contiguous, so downstream tools can memory-map them
+# other      = text table (np.savetxt) with metadata in header comments
+#
+#metadata contain settings of calculation (engine, PBC flag, box, numbers of atoms and frames)
+#and fit window with diffusion coefficient if diffusion was calculated
+#
+#per-atom MSD and unwrapped trajectory are written chunk by chunk directly into output file
+#(memory-mapped .npy file or HDF5 dataset), so they never have to fit into memory
+
+#json and os libraries - used for metadata and file extensions
+import json
+import os
+
+#contextmanager - output arrays are opened by with statement
+from contextlib import contextmanager
+
+#numpy library
+import numpy as np
+
+#stages of the pipeline
+from trajcache import load_trajectory
+from xyzreader import PRECISIONS
+from msdpipeline import box_settings, lag_times
+from msdengine import atom_msd, select_lags, FRAME_BLOCK
+from pbc import unwrap_frames
+
+
+#format of export from extension of file name
+def export_format(fn):
+
+	ext = os.path.splitext(fn)[1].lower()
+	if ext in (".npy", ".npz"):
+		return ext[1:]
+	if ext in (".h5", ".hdf5"):
+		return "hdf5"
+	return "text"
+
+
+#h5py package is optional
+def import_h5py():
+	try:
+		import h5py
+	except ImportError:
+		raise ValueError("HDF5 export needs h5py package (pip install h5py)")
+	return h5py
+
+
+#metadata of calculation, fit = dictionary with fit window and diffusion (see msdcli.report)
+def result_metadata(result, fit=None):
+
+	meta = {"engine": result.engine, "pbc": bool(result.pbc), "natoms": int(result.natoms), "nframes": int(result.nframes)}
+	if result.pbc:
+		meta["boxmin"] = [float(b) for b in result.boxmin]
+		meta["boxmax"] = [float(b) for b in result.boxmax]
+	if result.groups:
+		meta["groups"] = list(result.groups)
+	if result.nreplicas is not None:
+		meta["replicas"] = int(result.nreplicas)
+	meta.update(fit or {})
+	return meta
+
+
+#metadata as lines of text header, values are JSON
+def header_lines(meta):
+	return ["{} = {}".format(key, json.dumps(value)) for key, value in meta.items()]
+
+
+#sidecar file with metadata of .npy file
+def write_sidecar(fn, meta):
+	with open(fn + ".json", "w") as fout:
+		json.dump(meta, fout, indent=1)
+
+
+#metadata as HDF5 attributes, lists are stored as JSON strings
+def write_attrs(attrs, meta):
+	for key, value in meta.items():
+		attrs[key] = value if isinstance(value, (bool, int, float, str)) else json.dumps(value)
+
+
+#-------------------------------------------------------------------------------------------
+# MSD table - columns time, all atoms, replica-to-replica std (ensemble), species/groups |
+#-------------------------------------------------------------------------------------------
+def msd_table(result):
+
+	names = ["time", "all"] + (["std"] if result.nreplicas else []) + list(result.groups)
+	columns = [result.time, result.msd] + ([result.replica_std] if result.nreplicas else []) + list(result.group_msd if result.groups else [])
+	return names, np.column_stack(columns)
+
+
+#---------------------------------------------------------------------------------------------
+# MSD result with metadata into file, format from extension (npy, npz, h5/hdf5, text) |
+#---------------------------------------------------------------------------------------------
+def write_msd(fn, result, fit=None):
+
+	names, table = msd_table(result)
+	meta = dict(result_metadata(result, fit), columns=names)
+	fmt = export_format(fn)
+	if fmt == "npy":
+		np.save(fn, table)
+		write_sidecar(fn, meta)
+	elif fmt == "npz":
+		np.savez(fn, metadata=np.array(json.dumps(meta)), **dict(zip(names, table.T)))
+	elif fmt == "hdf5":
+		h5py = import_h5py()
+		with h5py.File(fn, "w") as fout:
+			write_attrs(fout.attrs, meta)
+			for name, column in zip(names, table.T):
+				fout.create_dataset(name, data=column)
+	else:
+		np.savetxt(fn, table, header="\n".join(header_lines(meta) + [" ".join(names)]))
+
+
+#------------------------------------------------------------------------------------------
+# writable output array of shape, extra = small arrays stored with it (e.g. times) -     |
+# .npy file is memory-mapped and HDF5 dataset is written in place, npz and text outputs |
+# are filled in memory and written at the end (text only for 2D arrays, extra arrays   |
+# become leading columns and rows of array become columns of text), partial output is  |
+# removed if writing fails                                                              |
+#------------------------------------------------------------------------------------------
+@contextmanager
+def array_output(fn, name, shape, meta, extra=None):
+
+	extra = extra or {}
+	fmt = export_format(fn)
+	if fmt == "text" and len(shape) != 2:
+		raise ValueError("Text export supports only tables, use .npy, .npz or .h5 file for {}".format(name))
+
+	try:
+		if fmt == "npy":
+			out = np.lib.format.open_memmap(fn, mode="w+", dtype=np.float64, shape=shape)
+			yield out
+			out.flush()
+			write_sidecar(fn, dict(meta, **{key: np.asarray(value).tolist() for key, value in extra.items()}))
+		elif fmt == "hdf5":
+			h5py = import_h5py()
+			with h5py.File(fn, "w") as fout:
+				write_attrs(fout.attrs, meta)
+				for key, value in extra.items():
+					fout.create_dataset(key, data=value)
+				yield fout.create_dataset(name, shape, dtype="f8")
+		else:
+			out = np.empty(shape)
+			yield out
+			if fmt == "npz":
+				np.savez(fn, metadata=np.array(json.dumps(meta)), **dict(extra, **{name: out}))
+			else:
+				if "rows" in meta:
+					meta = dict(meta, rows=meta["columns"], columns=meta["rows"])
+				np.savetxt(fn, np.column_stack(list(extra.values()) + [out.T]), header="\n".join(header_lines(meta)))
+	except BaseException:
+		remove_output(fn)
+		raise
+
+
+#partial output of cancelled or failed export is removed
+def remove_output(fn):
+	for path in (fn, fn + ".json"):
+		try:
+			os.remove(path)
+		except OSError:
+			pass
+
+
+#--------------------------------------------------------------------------------------------
+# per-atom MSD matrix (natoms, nlags) of .xyz trajectory with settings of run_msd, times of |
+# lags are stored with matrix, progress can cancel export - returns None if cancelled        |
+#--------------------------------------------------------------------------------------------
+def export_atom_msd(fnout, fn, pbc=False, boxmin=None, boxmax=None, engine="fft", cache=None, progress=None, memory=None,
+		max_lag=None, nlog=None, frames=None, precision="double"):
+
+	traj = load_trajectory(fn, cache, memory is not None, frames, 1, PRECISIONS[precision])
+	if traj.nframes < 2:
+		raise ValueError("Trajectory has to contain at least 2 frames for MSD calculation")
+	boxmin, boxmax, boxlen = box_settings(traj, pbc, boxmin, boxmax)
+	lags = select_lags(traj.nframes, max_lag, nlog)
+
+	meta = {"engine": engine, "pbc": bool(pbc), "natoms": traj.natoms, "nframes": traj.nframes, "rows": "atoms", "columns": "lags"}
+	if pbc:
+		meta["boxmin"] = [float(b) for b in boxmin]
+		meta["boxmax"] = [float(b) for b in boxmax]
+	with array_output(fnout, "atom_msd", (traj.natoms, len(lags)), meta, {"time": lag_times(traj.times, lags)}) as out:
+		finished = atom_msd(traj.atom_series(), out, engine, progress, boxlen, memory, lags)
+	if not finished:
+		remove_output(fnout)
+		return None
+	return fnout
+
+
+#---------------------------------------------------------------------------------------------
+# unwrapped trajectory (nframes, natoms, 3) of .xyz trajectory (positions are copied without |
+# PBC), frames are unwrapped and written in blocks - returns None if cancelled                |
+#---------------------------------------------------------------------------------------------
+def export_unwrapped(fnout, fn, pbc=False, boxmin=None, boxmax=None, cache=None, progress=None, memory=None, frames=None,
+		precision="double"):
+
+	traj = load_trajectory(fn, cache, memory is not None, frames, 1, PRECISIONS[precision])
+	boxmin, boxmax, boxlen = box_settings(traj, pbc, boxmin, boxmax)
+
+	meta = {"pbc": bool(pbc), "natoms": traj.natoms, "nframes": traj.nframes, "species": traj.species}
+	if pbc:
+		meta["boxmin"] = [float(b) for b in boxmin]
+		meta["boxmax"] = [float(b) for b in boxmax]
+	extra = {"time": np.asarray(traj.times), "types": np.asarray(traj.types)}
+	with array_output(fnout, "positions", traj.positions.shape, meta, extra) as out:
+		if boxlen is None:
+			blocks = ((it, traj.positions[it:it+FRAME_BLOCK]) for it in range(0, traj.nframes, FRAME_BLOCK))
+		else:
+			blocks = unwrap_frames(traj.positions, boxlen, FRAME_BLOCK)
+		finished = True
+		for it, block in blocks:
+			out[it:it+len(block)] = block
+			if progress is not None and progress((it+len(block))/float(traj.nframes)) is False:
+				finished = False
+				break
+	if not finished:
+		remove_output(fnout)
+		return None
+	return fnout
@@ -0,0 +1,182 @@
+#diffusion fitting - MSD in selected time range is fitted with polynomial k*t^a + q,
+#exponent a close to 1.0 means diffusive regime, diffusion coefficient is calculated
+#from slope of linear fit MSD = 6*D*t + q
+#
+#statistical error of diffusion coefficient is estimated by bootstrap over blocks of atoms -
+#MSD of independent blocks is resampled and slopes of all resamples are obtained at once from
+#least-squares sums (one matrix product), so 1000 resamples cost about as much as one fit
+#
+#ensemble of independent replicas gives error of diffusion from spread of diffusion of replicas
+#
+#linear (diffusive) regime is detected automatically from log-log MSD - slope 1 means MSD ~ t,
+#fits of all sliding windows are evaluated at once from cumulative sums of the fit sums
+
+#numpy library
+import numpy as np
+
+
+
+#polynomial function for fitting
+def power_law(x, k, q, a):
+	return k*x**a + q
+
+
+#time/MSD values in time range tstart <= t <= tend, None means no limit
+def select_window(x, y, tstart=None, tend=None):
+
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	mask = np.ones(len(x), dtype=bool)
+	if tstart is not None:
+		mask &= x >= tstart
+	if tend is not None:
+		mask &= x <= tend
+	return x[mask], y[mask]
+
+
+#fit MSD with polynomial k*x^a + q, returns (k, q, a), raises RuntimeError/ValueError/TypeError if fit fails
+def fit_power_law(x, y):
+
+	#scipy library is imported only when fit is requested, its import takes longer than the rest of startup
+	from scipy.optimize import curve_fit
+	params, _ = curve_fit(power_law, x, y)
+	return params[0], params[1], params[2]
+
+
+#diffusion coefficient from slope of linear fit
+def fit_diffusion(x, y):
+
+	k = np.polyfit(x, y, 1)
+	return k[0]/6.0
+
+
+#number of bootstrap resamples of blocks of atoms
+BOOTSTRAP_SAMPLES = 1000
+
+
+#-----------------------------------------------------------------------------------------
+# slopes of linear least-squares fits of every row of y (shape (nfits, npoints)) against x |
+#-----------------------------------------------------------------------------------------
+def fit_slopes(x, y):
+
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	if len(x) < 2:
+		raise ValueError("Linear fit needs at least 2 points")
+	xc = x - x.mean()
+	sxx = xc @ xc
+	if sxx == 0.0:
+		raise ValueError("Linear fit needs at least 2 different times")
+	return y @ xc/sxx
+
+
+#--------------------------------------------------------------------------------------------
+# diffusion coefficient with bootstrap error from MSD of blocks of atoms (shape (nblocks, npoints)), |
+# sizes = number of atoms in blocks, returns (diffusion, standard error)                      |
+#--------------------------------------------------------------------------------------------
+def bootstrap_diffusion(x, block_msd, sizes, nsamples=BOOTSTRAP_SAMPLES, seed=0):
+
+	block_msd = np.asarray(block_msd, dtype=np.float64)
+	sizes = np.asarray(sizes, dtype=np.float64)
+	nblocks = len(sizes)
+	if nblocks < 2:
+		raise ValueError("Bootstrap error needs at least 2 blocks of atoms")
+
+	#resampled blocks as weights - counts of every block in resample times its size
+	rng = np.random.default_rng(seed)
+	picks = rng.integers(0, nblocks, (nsamples, nblocks))
+	counts = np.zeros((nsamples, nblocks))
+	np.add.at(counts, (np.arange(nsamples)[:, None], picks), 1.0)
+	weights = counts*sizes
+	msd = (weights @ block_msd)/weights.sum(axis=1)[:, None]
+
+	d = fit_slopes(x, sizes @ block_msd/sizes.sum())/6.0
+	return d, fit_slopes(x, msd).std(ddof=1)/6.0
+
+
+#standard error of diffusion caused by subsampling of time origins - diffusion is fitted for MSD
+#of both halves of origins (shape (2, npoints)), error of their mean is |D1 - D2|/2
+def origin_diffusion_error(x, halves):
+
+	d = fit_slopes(x, halves)/6.0
+	return abs(d[0] - d[1])/2.0
+
+
+#standard error of ensemble diffusion from independent replicas - diffusion is fitted for MSD of
+#every replica (shape (nreplicas, npoints)), error of their mean is std/sqrt(nreplicas)
+def replica_diffusion_error(x, replica_msd):
+
+	d = fit_slopes(x, replica_msd)/6.0
+	if len(d) < 2:
+		raise ValueError("Error of diffusion needs at least 2 replicas")
+	return d.std(ddof=1)/np.sqrt(len(d))
+
+
+#automatic window - minimal number of points, fraction of the longest lag time used (MSD at
+#the longest lags is averaged over few time origins) and number of log-uniform bins of MSD
+WINDOW_MIN_POINTS = 8
+WINDOW_MAX_TIME = 0.5
+WINDOW_BINS = 512
+
+
+#--------------------------------------------------------------------------------------------
+# log-log slopes and their standard errors for all windows of w consecutive points, window   |
+# sums are differences of cumulative sums, so every width costs O(npoints) regardless of w   |
+#--------------------------------------------------------------------------------------------
+def window_fits(lx, ly, w):
+
+	c = [np.concatenate(([0.0], np.cumsum(v))) for v in (lx, ly, lx*lx, lx*ly, ly*ly)]
+	sx, sy, sxx, sxy, syy = [v[w:] - v[:-w] for v in c]
+	vxx = sxx - sx*sx/w
+	vxy = sxy - sx*sy/w
+	vyy = syy - sy*sy/w
+	slope = vxy/vxx
+	rss = np.maximum(vyy - slope*vxy, 0.0)
+	return slope, np.sqrt(rss/(w - 2)/vxx)
+
+
+#---------------------------------------------------------------------------------------------
+# automatic time range of diffusive regime - window of log-log MSD with slope closest to 1 and |
+# the lowest uncertainty of slope, MSD is averaged in log-uniform bins first (uniform lags   |
+# would put most points at long times), widths from all bins down to WINDOW_MIN_POINTS       |
+# (halved each step), returns (tstart, tend, a, diffusion), a = log-log slope of the window  |
+#---------------------------------------------------------------------------------------------
+def detect_linear_window(x, y, min_points=WINDOW_MIN_POINTS):
+
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	index = np.flatnonzero((x > 0.0) & (y > 0.0) & (x <= WINDOW_MAX_TIME*x[-1]))
+	if len(index) < min_points:
+		raise ValueError("Automatic time range needs at least {} points with positive time and MSD".format(min_points))
+	lx = np.log(x[index])
+	ly = np.log(y[index])
+
+	#log-uniform bins - first point of every non-empty bin, bins are averaged
+	edges = np.linspace(lx[0], lx[-1], WINDOW_BINS+1)[1:-1]
+	first = np.unique(np.concatenate(([0], np.searchsorted(lx, edges))))
+	first = first[first < len(lx)]
+	last = np.append(first[1:], len(lx)) - 1
+	counts = last - first + 1
+	bx = np.add.reduceat(lx, first)/counts
+	by = np.add.reduceat(ly, first)/counts
+	if len(first) < min_points:
+		raise ValueError("Automatic time range needs at least {} distinct lag times".format(min_points))
+
+	#centered sums reduce cancellation in differences of cumulative sums
+	bx -= bx.mean()
+	by -= by.mean()
+	best = None
+	w = len(first)
+	while w >= min_points:
+		slope, error = window_fits(bx, by, w)
+		score = np.abs(slope - 1.0) + error
+		i = int(np.nanargmin(score))
+		if best is None or score[i] < best[0]:
+			best = (score[i], i, w, slope[i])
+		w //= 2
+
+	_, i, w, a = best
+	tstart = x[index[first[i]]]
+	tend = x[index[last[i+w-1]]]
+	diff_x, diff_y = select_window(x, y, tstart, tend)
+	return tstart, tend, a, fit_diffusion(diff_x, diff_y)
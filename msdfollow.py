@@ -0,0 +1,161 @@
+#follow mode - MSD of trajectory which is still being written by simulation, every update
+#parses only frames appended since the previous update and adds their time origin/lag pairs
+#to MSD accumulators (sum of squared displacements per lag), accumulators of frames which are
+#already in file at the first update are computed at once by FFT engine
+#
+#box for periodic boundary conditions is detected from frames of the first update unless
+#it is specified by user, later frames are unwrapped with the same box, per-frame cells of
+#extended XYZ headers (Lattice=) are used instead of the box if frames contain them
+
+#os library - used for size of followed file
+import os
+
+#numpy library
+import numpy as np
+
+#stages of the pipeline
+from xyzreader import iter_xyz
+from xyzstream import detect_compression
+from pbc import box_bounds, box_length, FrameUnwrapper
+from msdengine import select_lags, compute_msd
+from msdpipeline import MSDResult, lag_times
+
+
+#maximal number of (frame, origin) pairs evaluated at once
+PAIR_BLOCK = 1 << 22
+
+
+class MSDFollower:
+
+	def __init__(self, fn, pbc=False, boxmin=None, boxmax=None, max_lag=None, nlog=None):
+		self.fn = fn
+		self.pbc = pbc
+		self.boxmin = boxmin
+		self.boxmax = boxmax
+		self.boxlen = None
+		self.max_lag = max_lag
+		self.nlog = nlog
+
+		#parsed state - file offset after the last complete frame, number of frames and atoms
+		self.offset = 0
+		self.nframes = 0
+		self.natoms = None
+
+		#unwrapped displacements from the first frame with shape (frames, natoms*3), frame times
+		#and sum of squared displacements over atoms and time origins for every lag
+		self.u = None
+		self.times = np.zeros(0)
+		self.sums = np.zeros(0)
+
+		#the first unwrapped frame, unwrapping carries box jumps between updates
+		self.first = None
+		self.unwrapper = None
+
+	#-----------------------------------------------------------------------------------------
+	# parse frames appended since the last update, returns MSD or None if there is no new frame |
+	#-----------------------------------------------------------------------------------------
+	def poll(self, progress=None):
+
+		if self.offset == 0 and detect_compression(self.fn) is not None:
+			raise ValueError("Follow mode needs uncompressed .xyz file, compressed trajectory can not be followed")
+		if os.path.getsize(self.fn) <= self.offset:
+			return None
+		n0 = self.nframes
+		for xyz, t, cells, offset in iter_xyz(self.fn, offset=self.offset, first_frame=self.nframes, follow=True):
+			self.add_frames(xyz, t, cells)
+			self.offset = offset
+		if self.nframes == n0:
+			return None
+		if n0 == 0:
+			self.seed(self.nframes)
+		else:
+			self.accumulate(n0, self.nframes)
+		return self.result()
+
+	def add_frames(self, xyz, t, cells=None):
+
+		nfr, natoms, _ = xyz.shape
+		if self.natoms is None:
+			self.natoms = natoms
+			self.first = xyz[0].copy()
+			if self.pbc and cells is not None:
+				self.boxmin = [0.0]*3
+				self.boxmax = [float(b) for b in np.diag(cells[0])]
+				self.unwrapper = FrameUnwrapper()
+			elif self.pbc:
+				detected_min, detected_max = box_bounds(xyz)
+				self.boxmin = [float(d) if u is None else u for u, d in zip(self.boxmin or [None]*3, detected_min)]
+				self.boxmax = [float(d) if u is None else u for u, d in zip(self.boxmax or [None]*3, detected_max)]
+				self.boxlen = box_length(self.boxmin, self.boxmax)
+				self.unwrapper = FrameUnwrapper(self.boxlen)
+		elif natoms != self.natoms:
+			raise ValueError("Number of atoms changed from {} to {} in appended frames".format(self.natoms, natoms))
+
+		#get rid of periodic boundary conditions - jumps are counted from the last parsed frame
+		if self.pbc:
+			if self.boxlen is None and cells is None:
+				raise ValueError("Appended frames do not contain Lattice in header")
+			xyz = self.unwrapper.add(xyz, None if self.boxlen is not None else cells)
+
+		#append displacements from the first frame, arrays grow by doubling
+		n0 = self.nframes
+		n1 = n0 + nfr
+		if self.u is None or n1 > self.u.shape[0]:
+			capacity = max(2*n0, n1, 16)
+			u = np.empty((capacity, natoms*3))
+			sums = np.zeros(capacity)
+			if self.u is not None:
+				u[:n0] = self.u[:n0]
+				sums[:n0] = self.sums[:n0]
+			self.u = u
+			self.sums = sums
+		self.u[n0:n1] = (xyz - self.first).reshape(nfr, natoms*3)
+		self.times = np.concatenate((self.times, t))
+		self.nframes = n1
+
+	#------------------------------------------------------------------------------------------
+	# accumulators of the first n frames from FFT engine - MSD averaged over atoms and origins |
+	# times number of pairs, the only pair of lag n-1 (origin 0) is not covered by engine      |
+	#------------------------------------------------------------------------------------------
+	def seed(self, n):
+
+		if n < 2:
+			return
+		r = self.u[:n].reshape(n, self.natoms, 3).transpose(1, 0, 2)
+		lags = select_lags(n, self.max_lag)
+		self.sums[lags] = compute_msd(r, "fft", lags=lags)*self.natoms*(n - lags)
+		if self.max_lag is None or self.max_lag >= n-1:
+			d = self.u[n-1] - self.u[0]
+			self.sums[n-1] = d @ d
+
+	#---------------------------------------------------------------------------------------------
+	# add pairs (new frame j, origin t < j) to sums, |u_j - u_t|^2 summed over atoms is evaluated |
+	# for a block of new frames at once as |u_j|^2 + |u_t|^2 - 2*u_j.u_t (one matrix product)    |
+	#---------------------------------------------------------------------------------------------
+	def accumulate(self, n0, n1):
+
+		u = self.u
+		norm = np.einsum("ij,ij->i", u[n0:n1], u[n0:n1])
+		start = 0 if self.max_lag is None else max(0, n0 - self.max_lag)
+		norm_all = np.einsum("ij,ij->i", u[start:n1], u[start:n1])
+		block = max(1, PAIR_BLOCK//(n1 - start))
+
+		for j0 in range(n0, n1, block):
+			j1 = min(j0 + block, n1)
+			t0 = 0 if self.max_lag is None else max(0, j0 - self.max_lag)
+			sq = norm[j0-n0:j1-n0, None] + norm_all[None, t0-start:j1-start] - 2.0*(u[j0:j1] @ u[t0:j1].T)
+			lag = np.arange(j0, j1)[:, None] - np.arange(t0, j1)[None, :]
+			mask = lag > 0
+			if self.max_lag is not None:
+				mask &= lag <= self.max_lag
+			self.sums[:j1] += np.bincount(lag[mask], weights=sq[mask], minlength=j1)[:j1]
+
+	#MSD from accumulators for selected lags
+	def result(self):
+
+		nt = self.nframes
+		if nt < 2:
+			return None
+		lags = select_lags(nt, self.max_lag, self.nlog)
+		msd = self.sums[lags]/(nt - lags)/float(self.natoms)
+		return MSDResult(lag_times(self.times, lags), msd, self.natoms, nt, "follow", self.pbc, self.boxmin, self.boxmax)
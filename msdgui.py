@@ -0,0 +1,1044 @@
+#GUI of application - Qt main window with MSD chart, calculation is done by compute core
+#(msdpipeline, msdfit) which is shared with headless command line mode
+
+#system library - used in QApp initi
+import sys
+
+#os library - used for number of CPUs
+import os
+
+#PyQt5 library - used for creating GUI widgets
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMenu, QVBoxLayout, QSizePolicy, QMessageBox, QPushButton, QFileDialog, QRadioButton, QLineEdit, QLabel, QProgressDialog, QCheckBox, QInputDialog, QDialog, QPlainTextEdit
+from PyQt5.QtGui import QFontDatabase
+from PyQt5 import QtCore
+from PyQt5.QtCore import pyqtSlot
+
+#matplotlib library - used for creating charts of MSD, figure is drawn by Qt canvas directly
+#(pyplot with its backend selection is not needed)
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+#numpy library
+import numpy as np
+
+#compute core - MSD pipeline (loading, unwrapping, MSD engines) and diffusion fitting
+from msdengine import ENGINES
+from msdpipeline import run_msd, parse_group, parse_frames_slice
+from msdfit import select_window, fit_power_law, fit_diffusion, bootstrap_diffusion, detect_linear_window, origin_diffusion_error, replica_diffusion_error
+
+#trajectory loading - parsed trajectories are cached in binary files for next loads
+from trajcache import TrajectoryCache
+
+#stages of calculation kept in memory for repeated calculations of this session
+from msdmemo import StageMemo
+
+#memory budget and frame selection from settings
+from msdcli import memory_bytes, frame_selection
+
+#run statistics - timing and memory of pipeline stages
+from msdprofile import RunStats
+
+#follow mode - MSD of trajectory which is still being written
+from msdfollow import MSDFollower
+
+#ensemble mode - MSD averaged over replica trajectories
+from msdensemble import run_ensemble
+
+#export of MSD, per-atom MSD and unwrapped trajectory
+from msdexport import write_msd, export_atom_msd, export_unwrapped
+
+
+#interval of polling followed file in ms
+FOLLOW_INTERVAL = 2000
+
+
+#import random
+
+
+
+class App(QMainWindow):
+
+	def __init__(self,args):
+
+		#command line arguments (see msdcli.build_parser)
+		self.args=args
+
+		#create QT App windows
+		super().__init__()
+		self.left = 10
+		self.top = 10
+		self.title = 'Diffusion Calculation'
+		self.width = 880
+		self.height = 620
+		self.x = []
+		self.y = []
+		self.groups = []
+		self.group_y = []
+		self.block_y = None
+		self.block_sizes = None
+		self.origin_y = None
+		self.replica_std = None
+		self.replica_x = None
+		self.replica_y = None
+		self.result = None
+		self.fit = {}
+		self.stats = None
+		self.stats_dialog = None
+		self.fnin = ""
+		self.replica_fns = []
+		self.cache = None if self.args.no_cache else TrajectoryCache()
+		self.memo = StageMemo()
+		self.msd_worker = None
+		self.progress = None
+		self.follower = None
+		self.follow_timer = QtCore.QTimer(self)
+		self.follow_timer.timeout.connect(self.follow_tick)
+		self.initUI()
+		self.xmin = 0.0
+		self.xmax = 0.0
+		self.ymin = 0.0
+		self.ymax = 0.0
+
+	def initUI(self):
+
+		self.setWindowTitle(self.title)
+		self.setGeometry(self.left, self.top, self.width, self.height)
+
+		self.m = PlotCanvas(self, width=7, height=6)
+		self.m.move(0,0)
+
+		#load XYZ file button
+		self.button_load = QPushButton('Load XYZ file', self)
+		self.button_load.setToolTip('Loads XYZ file for computing MSD and Diffusion')
+		self.button_load.move(720,25)
+		self.button_load.resize(140,30)
+		self.button_load.clicked.connect(self.load_click)
+		self.l3 = QLabel(self)
+		self.l3.setText("XYZ NOT! Loaded")
+		self.l3.move(725,55)
+
+		#calculate msd button
+		self.button_msd = QPushButton('Calculate MSD', self)
+		self.button_msd.setToolTip('Calculate Mean Squared Displacement')
+		self.button_msd.move(720,115)
+		self.button_msd.resize(140,30)
+		self.button_msd.clicked.connect(self.msd_click)
+		self.button_msd.setEnabled(False)
+
+		#logarithmic scale radio
+		self.r1 = QRadioButton("Log", self)
+		self.r1.setChecked(True)
+		self.r1.setToolTip('Switches to log scale')
+		self.r1.move(720,145)
+		self.r1.toggled.connect(self.logtoggle)
+		self.r1.setEnabled(False)
+		self.r2 = QRadioButton("Normal", self)
+		self.r2.setChecked(False)
+		self.r2.setToolTip('Switches to normal scale')
+		self.r2.move(720,165)
+		self.r2.toggled.connect(self.logtoggle)
+		self.r2.setEnabled(False)
+
+		#PBC checkbox and boxlenght textboxex
+		self.chbPBC = QCheckBox("Periodic Boundaries?",self)
+		self.chbPBC.setToolTip("Check if your xyz file uses periodic boundary conditions.")
+		self.chbPBC.move(720,185)
+		self.chbPBC.resize(150,40)
+		self.chbPBC.stateChanged.connect(self.pbctoggle)
+		self.chbPBC.setEnabled(False)
+
+		self.lb_mincol = QLabel(self)
+		self.lb_mincol.setText("Min")
+		self.lb_mincol.move(730,210)
+		self.lb_mincol.setVisible(False)
+		self.lb_maxcol = QLabel(self)
+		self.lb_maxcol.setText("Max")
+		self.lb_maxcol.move(810,210)
+		self.lb_maxcol.setVisible(False)
+
+		self.lb_xboxlen = QLabel(self)
+		self.lb_xboxlen.setText("X:")
+		self.lb_xboxlen.move(720,230)
+		self.lb_xboxlen.setVisible(False)
+		self.tb_xboxlenmin = QLineEdit(self)
+		self.tb_xboxlenmin.setVisible(False)
+		self.tb_xboxlenmin.move(735,235)
+		self.tb_xboxlenmin.resize(60,20)
+		self.tb_xboxlenmin.setToolTip("Minimum value on X-axis of your simulation box")
+		self.tb_xboxlenmax = QLineEdit(self)
+		self.tb_xboxlenmax.move(800,235)
+		self.tb_xboxlenmax.resize(60,20)
+		self.tb_xboxlenmax.setVisible(False)
+		self.tb_xboxlenmax.setToolTip("Maximum value on X-axis of your simulation box")
+
+		self.lb_yboxlen = QLabel(self)
+		self.lb_yboxlen.setText("Y:")
+		self.lb_yboxlen.move(720,250)
+		self.lb_yboxlen.setVisible(False)
+		self.tb_yboxlenmin = QLineEdit(self)
+		self.tb_yboxlenmin.move(735,255)
+		self.tb_yboxlenmin.resize(60,20)
+		self.tb_yboxlenmin.setVisible(False)
+		self.tb_yboxlenmin.setToolTip("Minimum value on Y-axis of your simulation box")
+		self.tb_yboxlenmax = QLineEdit(self)
+		self.tb_yboxlenmax.move(800,255)
+		self.tb_yboxlenmax.resize(60,20)
+		self.tb_yboxlenmax.setVisible(False)
+		self.tb_yboxlenmax.setToolTip("Maximum value on Y-axis of your simulation box")
+
+		self.lb_zboxlen = QLabel(self)
+		self.lb_zboxlen.setText("Z:")
+		self.lb_zboxlen.move(720,270)
+		self.lb_zboxlen.setVisible(False)
+		self.tb_zboxlenmin = QLineEdit(self)
+		self.tb_zboxlenmin.move(735,275)
+		self.tb_zboxlenmin.resize(60,20)
+		self.tb_zboxlenmin.setVisible(False)
+		self.tb_zboxlenmin.setToolTip("Minimum value on Z-axis of your simulation box")
+		self.tb_zboxlenmax = QLineEdit(self)
+		self.tb_zboxlenmax.move(800,275)
+		self.tb_zboxlenmax.resize(60,20)
+		self.tb_zboxlenmax.setVisible(False)
+		self.tb_zboxlenmax.setToolTip("Maximum value on Z-axis of your simulation box")
+		self.boxmin_tbs = (self.tb_xboxlenmin,self.tb_yboxlenmin,self.tb_zboxlenmin)
+		self.boxmax_tbs = (self.tb_xboxlenmax,self.tb_yboxlenmax,self.tb_zboxlenmax)
+
+		#zoom functionality button
+		self.btn_zoom = QPushButton("Rescale Plot",self)
+		self.btn_zoom.setToolTip('Rescales plot to specified range')
+		self.btn_zoom.move(720,325)
+		self.btn_zoom.resize(140,30)
+		self.btn_zoom.clicked.connect(self.zoomclick)
+		self.btn_zoom.setEnabled(False)
+
+		#zoom xranges
+		self.lb_xstart = QLabel(self)
+		self.lb_xstart.setText("X start")
+		self.lb_xstart.move(725,355)
+		self.tb_xstart = QLineEdit(self)
+		self.tb_xstart.move(720,380)
+		self.tb_xstart.resize(140,20)
+		self.tb_xstart.setEnabled(False)
+		self.tb_xstart.setToolTip("Start of X-axis on rescaled plot")
+		self.lb_xend = QLabel(self)
+		self.lb_xend.setText("X end")
+		self.lb_xend.move(725,400)
+		self.tb_xend = QLineEdit(self)
+		self.tb_xend.move(720,425)
+		self.tb_xend.resize(140,20)
+		self.tb_xend.setEnabled(False)
+		self.tb_xend.setToolTip("End of X-axis on rescaled plot")
+
+		#calculate diffusion button
+		self.button_dif = QPushButton('Calculate Diffusion', self)
+		self.button_dif.setToolTip('Calculate Diffusion coefficient')
+		self.button_dif.move(720,480)
+		self.button_dif.resize(140,30)
+		self.button_dif.clicked.connect(self.diff_click)
+		self.button_dif.setEnabled(False)
+
+		#tstart and tmin tend textboxes
+		self.lb_tstart = QLabel(self)
+		self.lb_tstart.setText("T start")
+		self.lb_tstart.move(725,510)
+		self.tb_tstart = QLineEdit(self)
+		self.tb_tstart.move(720,535)
+		self.tb_tstart.resize(140,20)
+		self.tb_tstart.setEnabled(False)
+		self.tb_tstart.setToolTip("Beginning of time interval for diffusion calculation")
+		self.lb_tend = QLabel(self)
+		self.lb_tend.setText("T end")
+		self.lb_tend.move(725,555)
+		self.tb_tend = QLineEdit(self)
+		self.tb_tend.move(720,580)
+		self.tb_tend.resize(140,20)
+		self.tb_tend.setEnabled(False)
+		self.tb_tstart.setToolTip("End of time interval for diffusion calculation")
+
+		#file menu
+		self.file_menu = QMenu('&File', self)
+		self.file_menu.addAction('&Load XYZ', self.load_click, QtCore.Qt.CTRL + QtCore.Qt.Key_O)
+		self.file_menu.addAction('Load &Replicas', self.replicas_click, QtCore.Qt.CTRL + QtCore.Qt.Key_R)
+		self.file_menu.addAction('&Calculate MSD', self.msd_click, QtCore.Qt.CTRL + QtCore.Qt.Key_M)
+		self.file_menu.addAction('&Calculate Diffusion', self.diff_click, QtCore.Qt.CTRL + QtCore.Qt.Key_D)
+		self.file_menu.addAction('&Auto Diffusion', self.autodiff_click, QtCore.Qt.CTRL + QtCore.Qt.Key_A)
+		self.file_menu.addAction('&Export Figure', self.exfig_click, QtCore.Qt.CTRL + QtCore.Qt.Key_S)
+		self.file_menu.addAction('&Export MSD values', self.msdexport_click, QtCore.Qt.CTRL + QtCore.Qt.Key_E)
+		self.file_menu.addAction('Export Per-Atom &MSD', self.atomexport_click)
+		self.file_menu.addAction('Export &Unwrapped Trajectory', self.unwrapexport_click)
+		self.file_menu.addAction('Run &Statistics', self.stats_click)
+		self.follow_action = self.file_menu.addAction('&Follow XYZ file', self.follow_toggle, QtCore.Qt.CTRL + QtCore.Qt.Key_F)
+		self.follow_action.setCheckable(True)
+		self.file_menu.addAction('&Quit', self.fileQuit, QtCore.Qt.CTRL + QtCore.Qt.Key_Q)
+		self.menuBar().addMenu(self.file_menu)
+
+		#settings menu
+		self.settings_menu = QMenu('&Settings', self)
+		self.settings_menu.addAction('MSD &Engine', self.engine_click)
+		self.settings_menu.addAction('&Frames', self.frames_click)
+		self.settings_menu.addAction('&Lag Times', self.lags_click)
+		self.settings_menu.addAction('Time &Origins', self.origins_click)
+		self.settings_menu.addAction('MSD &Workers', self.workers_click)
+		self.settings_menu.addAction('&Memory Budget', self.memory_click)
+		self.precision_action = self.settings_menu.addAction('Single &Precision Storage', self.precision_click)
+		self.precision_action.setCheckable(True)
+		self.precision_action.setChecked(self.args.precision == "single")
+		self.species_action = self.settings_menu.addAction('Per-&Species MSD', self.species_click)
+		self.species_action.setCheckable(True)
+		self.species_action.setChecked(self.args.species)
+		self.settings_menu.addAction('Atom &Groups', self.groups_click)
+		self.settings_menu.addAction('Error &Blocks', self.blocks_click)
+		self.menuBar().addMenu(self.settings_menu)
+
+		#help menu
+		self.help_menu = QMenu('&Help', self)
+		self.menuBar().addSeparator()
+		self.menuBar().addMenu(self.help_menu)
+		self.help_menu.addAction('&Help', self.help, QtCore.Qt.CTRL + QtCore.Qt.Key_H)
+
+		#intro Messagebox
+		if not self.args.muted:
+			QMessageBox.about(self, "Diffusion Calculator", "This apps computes Mean Squared Displacement and Diffusion Coefficient from *.xyz file. Select help if you need guidance.")
+
+		self.show()
+
+	#export file name, format is chosen by extension (see msdexport)
+	def export_name(self,filters):
+		options = QFileDialog.Options()
+		options |= QFileDialog.DontUseNativeDialog
+		fnout, _ = QFileDialog.getSaveFileName(self,"QFileDialog.getSaveFileName()", "",filters, options=options)
+		return fnout
+
+	#MSD values with metadata of calculation and of the last diffusion fit
+	def msdexport_click(self):
+		if self.result is None:
+			return
+		fnout = self.export_name("TXT files (*.txt);;NumPy files (*.npy *.npz);;HDF5 files (*.h5 *.hdf5);;All Files (*)")
+		if fnout == "":
+			return
+		try:
+			write_msd(fnout,self.result,self.fit)
+		except (OSError,ValueError) as e:
+			if not self.args.muted:
+				QMessageBox.about(self,"Export Error",str(e))
+
+	#per-atom MSD matrix is calculated and written chunk by chunk in background thread
+	def atomexport_click(self):
+		fnout = "" if self.fnin == "" else self.export_name("NumPy files (*.npy *.npz);;HDF5 files (*.h5 *.hdf5);;TXT files (*.txt);;All Files (*)")
+		if fnout != "":
+			self.export_start("Per-atom MSD export",export_atom_msd,fnout=fnout,engine=self.args.engine,max_lag=self.args.max_lag,nlog=self.args.log_lags)
+
+	#unwrapped trajectory is written block by block of frames in background thread
+	def unwrapexport_click(self):
+		fnout = "" if self.fnin == "" else self.export_name("NumPy files (*.npy *.npz);;HDF5 files (*.h5 *.hdf5);;All Files (*)")
+		if fnout != "":
+			self.export_start("Unwrapped trajectory export",export_unwrapped,fnout=fnout)
+
+	def export_start(self,title,job,**kwargs):
+
+		#only one calculation runs at a time
+		if self.msd_worker is not None and self.msd_worker.isRunning():
+			return
+
+		#settings of trajectory are the same as for MSD calculation
+		boxmin = [self.box_input(tb) for tb in self.boxmin_tbs]
+		boxmax = [self.box_input(tb) for tb in self.boxmax_tbs]
+		self.progress = QProgressDialog("Please Wait!", "Cancel", 0, 100, self)
+		self.progress.setWindowModality(QtCore.Qt.NonModal)
+		self.progress.setAutoReset(False)
+		self.progress.setAutoClose(False)
+		self.progress.resize(500,100)
+		self.progress.setWindowTitle(title)
+		self.msd_worker = MSDWorker(self,job,fn=self.fnin,pbc=self.chbPBC.isChecked(),boxmin=boxmin,boxmax=boxmax,cache=self.cache,memory=memory_bytes(self.args.memory_budget),frames=frame_selection(self.args),precision=self.args.precision,**kwargs)
+		self.msd_worker.progress.connect(self.progress.setValue)
+		self.msd_worker.done.connect(self.export_done)
+		self.msd_worker.failed.connect(self.msd_failed)
+		self.msd_worker.finished.connect(self.msd_finished)
+		self.progress.canceled.connect(self.msd_worker.cancel)
+		self.progress.show()
+		self.msd_worker.start()
+
+	def export_done(self,fnout):
+		if not self.args.muted:
+			QMessageBox.about(self,"Export Finished","Results were written to {}".format(fnout))
+
+
+	#MSD curves of species/groups plotted together with MSD of all atoms
+	def group_curves(self):
+		return list(zip(self.groups,self.group_y))
+
+	#plotted curves - species/groups and band of replica-to-replica standard deviation of ensemble MSD
+	def plot_curves(self):
+		if self.replica_std is None:
+			return self.group_curves()
+		return self.group_curves()+[("mean + std",self.y+self.replica_std),("mean - std",self.y-self.replica_std)]
+
+	def logtoggle(self):
+		self.m.plot(self.x,self.y,self.r1,self.xmin,self.xmax,self.ymin,self.ymax,self.plot_curves())
+
+	#this signals enabled/disables PBC min and max lenghts input
+	def pbctoggle(self,state):
+		if state == QtCore.Qt.Checked:
+			self.lb_mincol.setVisible(True)
+			self.lb_maxcol.setVisible(True)
+			self.lb_xboxlen.setVisible(True)
+			self.lb_yboxlen.setVisible(True)
+			self.lb_zboxlen.setVisible(True)
+			self.tb_xboxlenmin.setVisible(True)
+			self.tb_xboxlenmax.setVisible(True)
+			self.tb_yboxlenmin.setVisible(True)
+			self.tb_yboxlenmax.setVisible(True)
+			self.tb_zboxlenmin.setVisible(True)
+			self.tb_zboxlenmax.setVisible(True)
+		else:
+			self.lb_mincol.setVisible(False)
+			self.lb_maxcol.setVisible(False)
+			self.lb_xboxlen.setVisible(False)
+			self.lb_yboxlen.setVisible(False)
+			self.lb_zboxlen.setVisible(False)
+			self.tb_xboxlenmin.setVisible(False)
+			self.tb_xboxlenmax.setVisible(False)
+			self.tb_yboxlenmin.setVisible(False)
+			self.tb_yboxlenmax.setVisible(False)
+			self.tb_zboxlenmin.setVisible(False)
+			self.tb_zboxlenmax.setVisible(False)
+
+
+	#this signal rescales the range of chart with MSD values
+	def zoomclick(self):
+
+		#get axis ranges for rescaling with user input check
+		if not self.tb_xstart.text().replace(".","",1).isdigit():
+			if not self.args.muted:
+				QMessageBox.about(self,"MSD Rescale Error","There is a problem with value in Xstart. Using default value Xstart = "+str(self.x[0]))
+			xstart = self.x[0]
+		else:
+			xstart = float(self.tb_xstart.text())
+		if not self.tb_xend.text().replace(".","",1).isdigit():
+			if not self.args.muted:
+				QMessageBox.about(self,"MSD Rescale Error","There is a problem with value in Xend. Using default value Xend = "+str(self.x[-1]))
+			xend = self.x[-1]
+		else:
+			xend = float(self.tb_xend.text())
+
+		#found y values for selected xrange (times are sorted)
+		i = np.searchsorted(self.x,xstart,side="right")
+		ystart = self.y[i] if i < len(self.x) else self.y[0]
+		i = np.searchsorted(self.x,xend,side="left")
+		yend = self.y[i] if i < len(self.x) else self.y[-1]
+
+		#replot chart with new axis range
+		self.m.plot(self.x,self.y,self.r1,xstart,xend,ystart,yend,self.plot_curves())
+
+
+	#MSD engine used for calculation
+	def engine_click(self):
+		engines = sorted(ENGINES)
+		engine, ok = QInputDialog.getItem(self,"MSD Engine","MSD engine (fft = all lags, multitau/direct = suitable for selected lags):",engines,engines.index(self.args.engine),False)
+		if ok:
+			self.args.engine = engine
+
+	#frames used for calculation as START:STOP:STEP, empty = all frames
+	def frames_click(self):
+		text, ok = QInputDialog.getText(self,"Frames","Frames used for calculation START:STOP:STEP (e.g. 5000:6000 or ::10, empty = all frames):",QLineEdit.Normal,self.args.frames or "")
+		if not ok:
+			return
+		try:
+			if text.strip():
+				parse_frames_slice(text)
+		except ValueError as e:
+			if not self.args.muted:
+				QMessageBox.about(self,"Frames Error",str(e))
+			return
+		self.args.frames = text.strip() or None
+
+	#spacing of time origins for quick preview, 1 = all origins
+	def origins_click(self):
+		origins, ok = QInputDialog.getInt(self,"Time Origins","Use every S-th time origin (direct and multitau engines, 1 = all origins):",self.args.origins or 1,1,2**31-1)
+		if ok:
+			self.args.origins = origins if origins > 1 else None
+
+	#lag times of MSD - number of log-spaced lags and maximal lag in frames, 0 = all lags
+	def lags_click(self):
+		nlog, ok = QInputDialog.getInt(self,"Lag Times","Number of log-spaced lag times (0 = all lags):",self.args.log_lags or 0,0,2**31-1)
+		if not ok:
+			return
+		max_lag, ok = QInputDialog.getInt(self,"Lag Times","Maximal lag in frames (0 = no limit):",self.args.max_lag or 0,0,2**31-1)
+		if ok:
+			self.args.log_lags = nlog or None
+			self.args.max_lag = max_lag or None
+
+	#number of worker processes used for MSD calculation
+	def workers_click(self):
+		workers, ok = QInputDialog.getInt(self,"MSD Workers","Number of worker processes for parsing and MSD calculation:",self.args.workers,1,os.cpu_count() or 1)
+		if ok:
+			self.args.workers = workers
+
+	#memory budget per worker process in MB, 0 = whole trajectory is held in memory
+	def memory_click(self):
+		budget, ok = QInputDialog.getInt(self,"Memory Budget","Memory budget per worker process in MB (0 = no limit).\nWith budget the trajectory is streamed from binary cache file:",int(self.args.memory_budget or 0),0,2**31-1)
+		if ok:
+			self.args.memory_budget = budget
+
+	#coordinates stored in single precision - half memory, MSD is still accumulated in double precision
+	def precision_click(self):
+		self.args.precision = "single" if self.precision_action.isChecked() else "double"
+
+	#MSD of every species (atom label) is calculated together with MSD of all atoms
+	def species_click(self):
+		self.args.species = self.species_action.isChecked()
+
+	#user groups of atoms as NAME:INDICES separated by semicolons, e.g. "solvent:0-99,200; ions:100-199"
+	def groups_click(self):
+		text, ok = QInputDialog.getText(self,"Atom Groups","Groups of atoms NAME:INDICES separated by ';' (indices from 0, e.g. solvent:0-99,200):",QLineEdit.Normal,"; ".join(self.args.group))
+		if not ok:
+			return
+		group = [item.strip() for item in text.split(";") if item.strip()]
+		try:
+			for item in group:
+				parse_group(item)
+		except ValueError as e:
+			if not self.args.muted:
+				QMessageBox.about(self,"Atom Groups Error",str(e))
+			return
+		self.args.group = group
+
+	#number of blocks of atoms for bootstrap error of diffusion, 0 = no error estimate
+	def blocks_click(self):
+		blocks, ok = QInputDialog.getInt(self,"Error Blocks","Number of blocks of atoms for bootstrap error of diffusion (0 = no error):",self.args.error_blocks or 0,0,2**31-1)
+		if ok:
+			self.args.error_blocks = blocks or None
+
+	#------------------------------------------------------------------------------------
+	# run statistics panel - wall time, CPU time, peak memory and throughput of stages |
+	# of the last MSD calculation, panel is updated after every calculation           |
+	#------------------------------------------------------------------------------------
+	def stats_click(self):
+		if self.stats_dialog is None:
+			self.stats_dialog = QDialog(self)
+			self.stats_dialog.setWindowTitle("Run Statistics")
+			self.stats_dialog.resize(560,260)
+			self.stats_text = QPlainTextEdit(self.stats_dialog)
+			self.stats_text.setReadOnly(True)
+			self.stats_text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+			layout = QVBoxLayout(self.stats_dialog)
+			layout.addWidget(self.stats_text)
+		self.stats_update()
+		self.stats_dialog.show()
+
+	def stats_update(self):
+		if self.stats_dialog is not None:
+			self.stats_text.setPlainText(self.stats.summary() if self.stats is not None else "No MSD calculation yet.")
+
+	def fileQuit(self):
+		self.close()
+
+	def closeEvent(self, ce):
+
+		#running calculation is cancelled before window is closed
+		if self.msd_worker is not None and self.msd_worker.isRunning():
+			self.msd_worker.cancel()
+			self.msd_worker.wait()
+		self.fileQuit()
+
+	def help(self):
+		QMessageBox.about(self, "Help","""This application calculates diffusion from input *.xyz file.\n
+			\nsteps:
+			\n1. Click on Load XYZ file button and choose input file in *.xyz file format.
+			\n2. Choose logarithmic or normal scale with radio button under Calculate MSD button
+			\n3. If your *.xyz data uses Periodic Boundary Conditions then check checkbox with Periodic Boundaries? label
+			\n4. Write simulation box lenghts to newly visible textareas. If you left boxes empty then application will try to find simulation box lenghts by itself.
+			\n5. Click Calculate MSD box and wait for calculation to finish. If you don't want to wait then cancel the calculation with Cancel button on progress bar.
+			\n6. If you want to see data in specific time interval only then write the beginning and end of time interval in textboxes under Rescale plot button
+			\n7. Click Rescale plot button and try to find the most linear time range
+			\n8. Choose the beginning and end of timer interval and specify this range to Tstart and Tend textboxes.
+			\n9. Click Calculate diffusion button and write down the result of calculation. If you want more precise result then try to find time interval that brings a parameter closer to 1.0""")
+
+	@pyqtSlot()
+
+
+
+	#------------------------------------------------------------
+	# procedure that exports chart with MSD to PNG picture file |
+	#------------------------------------------------------------
+	def exfig_click(self):
+
+		options = QFileDialog.Options()
+		options |= QFileDialog.DontUseNativeDialog
+		fnout, _ = QFileDialog.getSaveFileName(self,"QFileDialog.getSaveFileName()", "","PNG files (*.png);;All Files (*)", options=options)
+		self.m.export(fnout)
+
+
+
+	#--------------------------------------------------------------------------------------------------------
+	# procedure that loads file adress of .xyz file with configurations and checks validity of data in file |
+	#--------------------------------------------------------------------------------------------------------
+	def load_click(self):
+
+		#create Open File Dialog
+		options = QFileDialog.Options()
+		options |= QFileDialog.DontUseNativeDialog
+		self.fnin, _ = QFileDialog.getOpenFileName(self,"QFileDialog.getOpenFileName()", "","All Files (*);;Data Files (*.data)", options=options)
+
+		#if user didn't cancle selection
+		if self.fnin != "":
+
+			#followed file and replicas are replaced by new one
+			self.follower = None
+			self.replica_fns = []
+
+			#===========================================================
+			# space for validity checking of data in file
+			#===========================================================
+
+			#QT elements enabling
+			self.r1.setEnabled(True)
+			self.r2.setEnabled(True)
+			self.button_msd.setEnabled(True)
+
+			#information for user - file is correctly loaded
+			self.l3.setText("XYZ Loaded")
+			if not self.args.muted:
+				QMessageBox.about(self, "File Loaded", "You're .XYZ file was successfully loaded... Click OK to continue.")
+
+		#QT elements enabling
+		self.chbPBC.setEnabled(True)
+		self.btn_zoom.setEnabled(False)
+		self.tb_xstart.setEnabled(False)
+		self.tb_xend.setEnabled(False)
+		#self.tb_ystart.setEnabled(False)
+		#self.tb_yend.setEnabled(False)
+		self.button_dif.setEnabled(False)
+		self.tb_tstart.setEnabled(False)
+		self.tb_tend.setEnabled(False)
+
+
+	#---------------------------------------------------------------------------------------
+	# ensemble mode - several replica .xyz files of one state point, MSD is averaged over |
+	# replicas which are processed concurrently by MSD workers                            |
+	#---------------------------------------------------------------------------------------
+	def replicas_click(self):
+
+		options = QFileDialog.Options()
+		options |= QFileDialog.DontUseNativeDialog
+		fns, _ = QFileDialog.getOpenFileNames(self,"QFileDialog.getOpenFileNames()", "","All Files (*);;Data Files (*.data)", options=options)
+		if not fns:
+			return
+
+		#replicas replace loaded/followed file
+		self.replica_fns = fns
+		self.fnin = ""
+		self.follower = None
+		self.follow_action.setChecked(False)
+		self.follow_timer.stop()
+
+		#QT elements enabling
+		self.r1.setEnabled(True)
+		self.r2.setEnabled(True)
+		self.button_msd.setEnabled(True)
+		self.chbPBC.setEnabled(True)
+		self.l3.setText("{} Replicas Loaded".format(len(fns)))
+		if not self.args.muted:
+			QMessageBox.about(self, "Replicas Loaded", "{} replica .XYZ files were loaded, MSD will be averaged over replicas... Click OK to continue.".format(len(fns)))
+
+	#number from user input textbox (box boundary, time), None if textbox is not valid and default value is used
+	def box_input(self,textbox):
+		if textbox.text().replace(".","",1).isdigit():
+			return float(textbox.text())
+		return None
+
+	#----------------------------------
+	# Diffusion calculation procedure |
+	#----------------------------------
+	def diff_click(self):
+
+		#get start time for MSD and end time for MSD
+		tstart = self.box_input(self.tb_tstart)
+		tend = self.box_input(self.tb_tend)
+		if tstart is None:
+			if not self.args.muted:
+				QMessageBox.about(self,"Time Range Error", "There is a problem with value in Tstart. Using default value Tstart = "+str(self.x[0]))
+			tstart = self.x[0]
+		elif tstart < self.x[0] and not self.args.muted:
+			QMessageBox.about(self,"Time Range Error", "You have chosen lower value of Tstart then exists in your input file. Using default value Tstart = "+str(self.x[0]))
+		if tend is None:
+			if not self.args.muted:
+				QMessageBox.about(self,"Time Range Error", "There is a problem with value in Tend. Using default value Tend = "+str(self.x[-1]))
+			tend = self.x[-1]
+		elif tend > self.x[-1] and not self.args.muted:
+			QMessageBox.about(self,"Time Range Error","You have chosen higher value of Tend then exists in your input file. Using default value Tend = "+str(self.x[-1]))
+
+		#if tstart is >= tend error check
+		if tstart - tend >= 0:
+			if not self.args.muted:
+				QMessageBox.about(self,"Time Range Error","You have chosen higher tstart = {} then tend = {} or equal values. Using default value Tstar = {} and Tend = {}".format(tstart,tend,self.x[0],self.x[-1]))
+			tstart = self.x[0]
+			tend = self.x[-1]
+
+		#diffusion of all atoms and of every species/group on user-specified/default range
+		lines = []
+		for name, y in [("all",self.y)]+self.group_curves():
+			diff_x, diff_y = select_window(self.x,y,tstart,tend)
+
+			#fit MSD with polynomial, diffusion calculation from linear fit
+			try:
+				k, q, a = fit_power_law(diff_x,diff_y)
+				d = fit_diffusion(diff_x,diff_y)
+			except (RuntimeError,ValueError,TypeError):
+				if not self.args.muted:
+					QMessageBox.about(self,"Diffusion Calculation Error","Cant calculate diffusion of {} on specified time range. Try another time range.".format(name))
+				return
+			lines.append("a = {}  \nDiffusion = {}".format(round(a,4),round(d,4)) if not lines else "{}: a = {}  Diffusion = {}".format(name,round(a,4),round(d,4)))
+
+			#fit window and diffusion of all atoms are exported with MSD values
+			if len(lines) == 1:
+				self.fit = {"tstart": float(tstart), "tend": float(tend), "a": float(a), "diffusion": float(d)}
+
+			#bootstrap error of diffusion of all atoms from MSD of blocks of atoms
+			if len(lines) == 1 and self.block_y is not None:
+				diff_x, block_y = select_window(self.x,self.block_y.T,tstart,tend)
+				try:
+					_, error = bootstrap_diffusion(diff_x,block_y.T,self.block_sizes)
+					lines[0] += " +- {}".format(round(error,4))
+				except ValueError:
+					pass
+
+			#error of ensemble diffusion from spread of diffusion of replicas
+			if len(lines) == 1 and self.replica_y is not None:
+				diff_x, replica_y = select_window(self.replica_x,self.replica_y.T,tstart,tend)
+				try:
+					lines[0] += " +- {} (replicas)".format(round(replica_diffusion_error(diff_x,replica_y.T),4))
+				except ValueError:
+					pass
+
+			#error of diffusion of all atoms caused by subsampling of time origins
+			if len(lines) == 1 and self.origin_y is not None:
+				diff_x, half_y = select_window(self.x,self.origin_y.T,tstart,tend)
+				try:
+					lines[0] += "  \nOrigin subsampling error = {}".format(round(origin_diffusion_error(diff_x,half_y.T),4))
+				except ValueError:
+					pass
+
+		#print diffusion result to user
+		QMessageBox.about(self, "Diffusion Result", "Fitting polynomial kx^a + q \n\n"+"\n".join(lines))
+
+
+
+	#------------------------------------------------------------------------------------------
+	# automatic diffusion - time range with log-log slope of MSD closest to 1 is written to  |
+	# Tstart and Tend textboxes and diffusion is calculated on this range                    |
+	#------------------------------------------------------------------------------------------
+	def autodiff_click(self):
+
+		if len(self.x) == 0:
+			return
+		try:
+			tstart, tend, _, _ = detect_linear_window(self.x,self.y)
+		except ValueError as e:
+			if not self.args.muted:
+				QMessageBox.about(self,"Diffusion Calculation Error","Cant detect time range for diffusion calculation: {}".format(e))
+			return
+		self.tb_tstart.setText(str(tstart))
+		self.tb_tend.setText(str(tend))
+		self.diff_click()
+
+
+
+	#------------------------------------------------------
+	# procedure that calculates Mean-Squared Displacement |
+	#------------------------------------------------------
+	def msd_click(self):
+
+		#only one calculation runs at a time
+		if self.msd_worker is not None and self.msd_worker.isRunning():
+			return
+
+		#if xyz is used with periodic boundary conditions, empty box boundaries are detected from coordinates
+		pbc = self.chbPBC.isChecked()
+		boxmin = [self.box_input(tb) for tb in self.boxmin_tbs]
+		boxmax = [self.box_input(tb) for tb in self.boxmax_tbs]
+		groups = dict(parse_group(item) for item in self.args.group)
+		frames = frame_selection(self.args)
+
+		#create progress bar for calculation progress, main window stays usable during calculation
+		self.progress = QProgressDialog("Please Wait!", "Cancel", 0, 100, self)
+		self.progress.setWindowModality(QtCore.Qt.NonModal)
+		self.progress.setAutoReset(False)
+		self.progress.setAutoClose(False)
+		self.progress.resize(500,100)
+		self.progress.setWindowTitle("MSD calculation")
+
+		#calculate Mean-Squared Displacement in background thread
+		#ensemble of replicas is averaged by run_ensemble, its error comes from replicas instead of blocks of atoms
+		self.stats = RunStats()
+		options = dict(pbc=pbc,boxmin=boxmin,boxmax=boxmax,engine=self.args.engine,cache=self.cache,workers=self.args.workers,memory=memory_bytes(self.args.memory_budget),max_lag=self.args.max_lag,nlog=self.args.log_lags,species=self.args.species,groups=groups,frames=frames,origins=self.args.origins,precision=self.args.precision)
+		if self.replica_fns:
+			self.msd_worker = MSDWorker(self,run_ensemble,fns=self.replica_fns,**options)
+		else:
+			self.msd_worker = MSDWorker(self,run_msd,fn=self.fnin,blocks=self.args.error_blocks,stats=self.stats,memo=self.memo,**options)
+		self.msd_worker.progress.connect(self.progress.setValue)
+		self.msd_worker.done.connect(self.msd_done)
+		self.msd_worker.failed.connect(self.msd_failed)
+		self.msd_worker.finished.connect(self.msd_finished)
+		self.progress.canceled.connect(self.msd_worker.cancel)
+		self.button_msd.setEnabled(False)
+		self.progress.show()
+		self.msd_worker.start()
+
+	#---------------------------------------------------------------------------------------
+	# follow mode - file is polled and MSD is updated from frames appended since last poll |
+	#---------------------------------------------------------------------------------------
+	def follow_toggle(self):
+		self.follower = None
+		if self.follow_action.isChecked():
+			self.follow_timer.start(FOLLOW_INTERVAL)
+			self.follow_tick()
+		else:
+			self.follow_timer.stop()
+
+	def follow_tick(self):
+
+		#no file or previous calculation is still running
+		if self.fnin == "" or (self.msd_worker is not None and self.msd_worker.isRunning()):
+			return
+
+		#settings are taken when following starts
+		if self.follower is None:
+			boxmin = [self.box_input(tb) for tb in self.boxmin_tbs]
+			boxmax = [self.box_input(tb) for tb in self.boxmax_tbs]
+			self.follower = MSDFollower(self.fnin,self.chbPBC.isChecked(),boxmin,boxmax,self.args.max_lag,self.args.log_lags)
+
+		self.progress = None
+		self.msd_worker = MSDWorker(self,self.follower.poll)
+		self.msd_worker.done.connect(self.msd_done)
+		self.msd_worker.failed.connect(self.follow_failed)
+		self.msd_worker.start()
+
+	def follow_failed(self,message):
+		self.follow_action.setChecked(False)
+		self.follow_toggle()
+		self.msd_failed(message)
+
+	#MSD calculation finished, cancelled or failed - hide progress bar
+	def msd_finished(self):
+		if self.progress is not None:
+			self.progress.hide()
+		self.button_msd.setEnabled(True)
+
+	def msd_failed(self,message):
+		if not self.args.muted:
+			QMessageBox.about(self,"File Loading Error",message)
+
+	#results of MSD calculation are delivered from background thread
+	def msd_done(self,result):
+
+		#box boundaries used for unwrapping are shown to user
+		if result.pbc:
+			for tb,value in zip(self.boxmin_tbs+self.boxmax_tbs,result.boxmin+result.boxmax):
+				tb.setText(str(value))
+		time = result.time
+		msd = result.msd
+
+		#setting axis ranges
+		self.xmin = time[0]
+		self.xmax = time[-1]
+		self.ymin = msd[0]
+		self.ymax = msd[-1]
+
+		#save MSD chart data to global variables
+		self.x = time
+		self.y = msd
+		self.groups = result.groups
+		self.group_y = list(result.group_msd) if result.groups else []
+		self.block_y = result.block_msd
+		self.block_sizes = result.block_sizes
+		self.origin_y = result.origin_msd
+		self.result = result
+		self.fit = {}
+		replicas = result.nreplicas is not None and result.nreplicas > 1
+		self.replica_std = result.replica_std if replicas else None
+		self.replica_x = result.replica_time if replicas else None
+		self.replica_y = result.replica_msd if replicas else None
+
+		#plot calculated MSD, follow mode updates have no run statistics
+		if self.stats is not None and self.follower is None:
+			with self.stats.stage("plot") as record:
+				self.m.plot(time,msd,self.r1,self.xmin,self.xmax,self.ymin,self.ymax,self.plot_curves())
+				record["frames"] = result.nframes
+			self.stats_update()
+		else:
+			self.m.plot(time,msd,self.r1,self.xmin,self.xmax,self.ymin,self.ymax,self.plot_curves())
+
+		#QT elements enabling
+		self.tb_tstart.setEnabled(True)
+		self.tb_tend.setEnabled(True)
+		self.tb_xstart.setEnabled(True)
+		self.tb_xend.setEnabled(True)
+		self.btn_zoom.setEnabled(True)
+		self.button_dif.setEnabled(True)
+
+
+
+#--------------------------------------------------------------------------------------------
+# background thread with MSD job (run_msd or MSDFollower.poll) - progress and results are |
+# delivered by Qt signals, calculation is cancelled cooperatively between chunks of atoms  |
+#--------------------------------------------------------------------------------------------
+class MSDWorker(QtCore.QThread):
+
+	progress = QtCore.pyqtSignal(int)
+	done = QtCore.pyqtSignal(object)
+	failed = QtCore.pyqtSignal(str)
+
+	def __init__(self, parent, job, **kwargs):
+		super().__init__(parent)
+		self.job = job
+		self.kwargs = kwargs
+		self.cancelled = False
+
+	def cancel(self):
+		self.cancelled = True
+
+	#called by MSD engine in background thread, returns False if calculation was cancelled
+	def report(self, fraction):
+		self.progress.emit(int(fraction*100))
+		return not self.cancelled
+
+	def run(self):
+		try:
+			result = self.job(progress=self.report, **self.kwargs)
+		except Exception as e:
+			#any error (also broken process pool or out of memory) is reported, thread must not die silently
+			self.failed.emit(str(e) or type(e).__name__)
+			return
+		if result is not None:
+			self.done.emit(result)
+
+
+
+#-------------------------------------------------------------------------------------------
+# view-dependent decimation of curve - visible points are split into nbins bins of x (log- |
+# uniform on log axis) and only points with min and max y of every bin are kept in x order, |
+# so the drawn envelope is the same as of full curve, x has to be sorted                    |
+#-------------------------------------------------------------------------------------------
+def decimate(x, y, xmin, xmax, nbins, log=False):
+
+	#visible points with one neighbour on both sides, so lines continue out of view
+	i0 = max(np.searchsorted(x, xmin, side="left") - 1, 0)
+	i1 = min(np.searchsorted(x, xmax, side="right") + 1, len(x))
+	x = x[i0:i1]
+	y = y[i0:i1]
+	if len(x) <= 4*nbins:
+		return x, y
+
+	#bins of x, non-positive values on log axis are not drawn anyway
+	if log:
+		lx = np.log(np.where(x > 0.0, x, np.nan))
+		lo, hi = np.nanmin(lx), np.nanmax(lx)
+		b = np.nan_to_num((lx - lo)/(hi - lo)*nbins, nan=0.0).astype(np.int64)
+	else:
+		b = ((x - x[0])/(x[-1] - x[0])*nbins).astype(np.int64)
+
+	#bins are contiguous in sorted x - min and max of every bin by reduceat, the first point
+	#equal to extreme of its bin is kept
+	starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+	counts = np.diff(np.r_[starts, len(x)])
+	keep = [[0, len(x)-1]]
+	for extreme in (np.minimum, np.maximum):
+		hit = np.flatnonzero(y == np.repeat(extreme.reduceat(y, starts), counts))
+		keep.append(hit[np.r_[True, b[hit[1:]] != b[hit[:-1]]]])
+	keep = np.unique(np.concatenate(keep))
+	return x[keep], y[keep]
+
+
+class PlotCanvas(FigureCanvas):
+
+	#number of decimation bins per pixel of axes width
+	BINS_PER_PIXEL = 1
+
+	def __init__(self, parent=None, width=5, height=4, dpi=100):
+		fig = Figure(figsize=(width, height), dpi=dpi)
+
+		self.axes = fig.add_subplot(111)
+		self.axes.set_autoscalex_on(False)
+		self.axes.set_autoscaley_on(False)
+		self.axes.grid(True)
+		self.axes.set_title('Mean Squared Displacement')
+		self.axes.set_xlabel('t')
+		self.axes.set_ylabel('MSD')
+
+		#persistent lines - MSD of all atoms and of species/groups, full data are kept for decimation
+		self.line = None
+		self.curve_lines = []
+		self.x = np.zeros(0)
+		self.ys = []
+
+		FigureCanvas.__init__(self, fig)
+		self.setParent(parent)
+
+		FigureCanvas.setSizePolicy(self,QSizePolicy.Expanding,QSizePolicy.Expanding)
+		FigureCanvas.updateGeometry(self)
+
+		#lines are decimated again whenever visible range changes
+		self.axes.callbacks.connect('xlim_changed', self.redecimate)
+
+
+	#curves = additional (label, MSD) curves of species/groups of atoms
+	def plot(self,x,y,r1,xmin,xmax,ymin,ymax,curves=()):
+
+		ax = self.axes
+
+		#full data, lines are created once and then only updated
+		self.x = np.asarray(x, dtype=np.float64)
+		self.ys = [np.asarray(y, dtype=np.float64)] + [np.asarray(cy, dtype=np.float64) for _, cy in curves]
+		if self.line is None:
+			self.line, = ax.plot([],[],'b-')
+		while len(self.curve_lines) > len(curves):
+			self.curve_lines.pop().remove()
+		while len(self.curve_lines) < len(curves):
+			self.curve_lines += ax.plot([],[],'-',color='C{}'.format(len(self.curve_lines)+1))
+
+		#MSD of species/groups with legend, MSD of all atoms stays blue
+		if curves:
+			self.line.set_label('all')
+			for line, (label, _) in zip(self.curve_lines, curves):
+				line.set_label(label)
+			ax.legend(loc='best')
+		elif ax.get_legend() is not None:
+			ax.get_legend().remove()
+
+		#scale type
+		if r1.isChecked():
+			ax.set_xscale('log')
+			ax.set_yscale('log')
+			ax.set_ylim([ymin,ymax])
+			ax.set_xlim([xmin,xmax],emit=False)
+		else:
+			ax.set_xscale('linear')
+			ax.set_yscale('linear')
+			ax.set_ylim([ymin,ymax])
+			ax.set_xlim([xmin,xmax],emit=False)
+			ax.ticklabel_format(style='sci',axis='both', scilimits=(-2,2))
+
+		#limits are set without callbacks, lines are decimated once for new data and range
+		self.redecimate()
+		self.draw()
+
+	#lines show decimated data of visible range
+	def redecimate(self,ax=None):
+
+		if self.line is None:
+			return
+		xmin, xmax = sorted(self.axes.get_xlim())
+		nbins = max(int(self.axes.bbox.width*self.BINS_PER_PIXEL), 1)
+		log = self.axes.get_xscale() == 'log'
+		for line, y in zip([self.line]+self.curve_lines, self.ys):
+			line.set_data(*decimate(self.x, y, xmin, xmax, nbins, log))
+
+	def export(self,path):
+		self.figure.	savefig(path)
+
+#start GUI application with parsed command line arguments
+def run(args):
+	app = QApplication(sys.argv[:1])
+	ex = App(args)
+	return app.exec_()
@@ -0,0 +1,84 @@
+#in-session memo of pipeline stages - parsed trajectory, unwrapped coordinates and MSD result
+#are kept in memory under keys of settings which produced them, so repeated calculation
+#recomputes only stages downstream of the changed setting (e.g. another engine or lag
+#selection reuses unwrapped coordinates, another box reuses parsed trajectory)
+#
+#keys of stages are nested - key of unwrapped coordinates contains key of trajectory and key
+#of MSD contains key of unwrapped coordinates, trajectory is identified by path, size,
+#modification time and content hash of file (see trajcache), so changed file is parsed again
+#
+#memo is bounded in size (MSDIFF_MEMO_MAX_BYTES) and least recently used entries are evicted,
+#memory-mapped arrays (trajectory cache, out-of-core mode) do not count into the size
+
+#os and threading libraries - used for size limit and for access from background threads
+import os
+import threading
+
+#ordered dictionary keeps entries in order of use
+from collections import OrderedDict
+
+#numpy library
+import numpy as np
+
+
+#default size limit of memo, can be changed by environment variable
+MEMO_MAX_BYTES = int(os.environ.get("MSDIFF_MEMO_MAX_BYTES", 2*1024**3))
+
+
+#bytes held in memory by arrays among attributes of object (trajectory, MSD result), memory-mapped arrays are free
+def memo_bytes(obj):
+
+	arrays = [obj] if isinstance(obj, np.ndarray) else [v for v in vars(obj).values() if isinstance(v, np.ndarray)]
+	return sum(a.nbytes for a in arrays if not isinstance(a, np.memmap))
+
+
+#hashable key of frame selection (slice objects are not hashable)
+def frames_key(frames):
+	return None if frames is None else (frames.start, frames.stop, frames.step)
+
+
+#--------------------------------------------------------------------------------------------
+# least recently used memo of stages, entries are shared between GUI and calculation thread |
+#--------------------------------------------------------------------------------------------
+class StageMemo:
+
+	def __init__(self, max_bytes=MEMO_MAX_BYTES):
+		self.max_bytes = max_bytes
+		self.entries = OrderedDict()
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	#value of key or None, found entry becomes the most recently used one
+	def get(self, key):
+		with self.lock:
+			if key not in self.entries:
+				self.misses += 1
+				return None
+			self.hits += 1
+			self.entries.move_to_end(key)
+			return self.entries[key][0]
+
+	#entry larger than the whole memo is not stored
+	def fits(self, nbytes):
+		return nbytes <= self.max_bytes
+
+	def put(self, key, value, nbytes=None):
+
+		nbytes = memo_bytes(value) if nbytes is None else nbytes
+		if not self.fits(nbytes):
+			return
+		with self.lock:
+			if key in self.entries:
+				self.nbytes -= self.entries.pop(key)[1]
+			self.entries[key] = (value, nbytes)
+			self.nbytes += nbytes
+			while self.nbytes > self.max_bytes:
+				_, (_, evicted) = self.entries.popitem(last=False)
+				self.nbytes -= evicted
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.nbytes = 0
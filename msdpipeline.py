@@ -0,0 +1,232 @@
+#MSD pipeline shared by GUI and command line - loading of trajectory, unwrapping of periodic
+#boundary conditions and MSD calculation, no GUI library is imported here
+
+#numpy library
+import numpy as np
+
+#stages of the pipeline
+from trajcache import load_trajectory, file_identity
+from xyzreader import PRECISIONS
+from pbc import box_length
+from msdengine import compute_msd, select_lags, combine_halves, unwrap_atoms
+from msdprofile import RunStats
+from msdmemo import frames_key
+
+
+#-----------------------------------------------------------------------------------
+# result of MSD calculation - lag times, MSD values and settings used for calculation, |
+# MSD of species/groups of atoms are rows of group_msd in order of group names,       |
+# MSD of blocks of atoms (rows of block_msd) are used for error of diffusion,         |
+# with subsampled time origins origin_msd are MSD of two halves of origins and        |
+# origin_error is standard error of MSD caused by subsampling, ensemble of replicas     |
+# has replica-to-replica standard deviation of MSD and MSD of every replica at lags    |
+# replica_time (see msdensemble)                                                       |
+#-----------------------------------------------------------------------------------
+class MSDResult:
+
+	def __init__(self, time, msd, natoms, nframes, engine, pbc=False, boxmin=None, boxmax=None, groups=None, group_msd=None,
+			block_msd=None, block_sizes=None, origin_msd=None, origin_error=None, nreplicas=None, replica_std=None,
+			replica_time=None, replica_msd=None):
+		self.time = time
+		self.msd = msd
+		self.natoms = natoms
+		self.nframes = nframes
+		self.engine = engine
+		self.pbc = pbc
+		self.boxmin = boxmin
+		self.boxmax = boxmax
+		self.groups = groups or []
+		self.group_msd = group_msd
+		self.block_msd = block_msd
+		self.block_sizes = block_sizes
+		self.origin_msd = origin_msd
+		self.origin_error = origin_error
+		self.nreplicas = nreplicas
+		self.replica_std = replica_std
+		self.replica_time = replica_time
+		self.replica_msd = replica_msd
+
+
+#frames selected by text "START:STOP:STEP" (like python slice, empty values = default)
+def parse_frames_slice(text):
+
+	try:
+		parts = [int(v) if v.strip() else None for v in text.split(":")]
+	except ValueError:
+		parts = []
+	if len(parts) not in (2, 3) or (len(parts) == 3 and parts[2] is not None and parts[2] <= 0):
+		raise ValueError("Invalid frame selection '{}', expected START:STOP:STEP (e.g. 5000:6000 or ::10)".format(text))
+	return slice(*parts)
+
+
+#------------------------------------------------------------------------------
+# group of atoms from text "name:indices", indices are separated by commas and |
+# can contain inclusive ranges, e.g. "solvent:0-99,200" (atoms from 0)         |
+#------------------------------------------------------------------------------
+def parse_group(text):
+
+	name, sep, spec = text.partition(":")
+	if not sep or not name.strip():
+		raise ValueError("Invalid group '{}', expected NAME:INDICES (e.g. solvent:0-99,200)".format(text))
+	indices = []
+	try:
+		for item in spec.split(","):
+			first, _, last = item.strip().partition("-")
+			indices.extend(range(int(first), int(last or first)+1))
+	except ValueError:
+		raise ValueError("Invalid indices of group '{}', expected e.g. 0-99,200".format(name.strip()))
+	return name.strip(), indices
+
+
+#membership matrix of groups - all atoms, species of atoms (if requested) and user groups of indices,
+#blocks of atoms for error estimate are added as last rows (atom ia belongs to block ia % blocks)
+def group_membership(traj, species=False, groups=None, blocks=None):
+
+	names = ["all"]
+	rows = [np.ones(traj.natoms)]
+	if species:
+		for it, name in enumerate(traj.species):
+			names.append(name)
+			rows.append((traj.types == it).astype(np.float64))
+	for name, indices in (groups or {}).items():
+		indices = np.asarray(indices, dtype=np.int64)
+		if len(indices) and (indices.min() < 0 or indices.max() >= traj.natoms):
+			raise ValueError("Group '{}' contains atom index out of range 0 ... {}".format(name, traj.natoms-1))
+		row = np.zeros(traj.natoms)
+		row[indices] = 1.0
+		names.append(name)
+		rows.append(row)
+	if blocks:
+		if blocks < 2 or blocks > traj.natoms:
+			raise ValueError("Number of blocks for error estimate has to be between 2 and number of atoms ({})".format(traj.natoms))
+		block = np.arange(traj.natoms) % blocks
+		rows.extend((block == ib).astype(np.float64) for ib in range(blocks))
+	return names, np.array(rows)
+
+
+#lag times of selected lags - times of frames relative to the first frame, so selection of
+#frames starting later in trajectory (e.g. 5000:6000) still has time axis starting at 0
+def lag_times(times, lags):
+	times = np.asarray(times)
+	return times[lags] - times[0]
+
+
+#box bounds and box lengths used for unwrapping (None without PBC), user box bounds are lists
+#with None where bounds are detected from coordinates, per-frame cells of extended XYZ file
+#take precedence - they are used for unwrapping and bounds are the box of the first cell
+def box_settings(traj, pbc, boxmin=None, boxmax=None):
+
+	if not pbc:
+		return boxmin, boxmax, None
+	if traj.cells is not None:
+		return [0.0]*3, [float(b) for b in np.diag(traj.cells[0])], np.asarray(traj.cells)
+	detected_min, detected_max = traj.box_bounds()
+	boxmin = [float(d) if u is None else u for u, d in zip(boxmin or [None]*3, detected_min)]
+	boxmax = [float(d) if u is None else u for u, d in zip(boxmax or [None]*3, detected_max)]
+	return boxmin, boxmax, box_length(boxmin, boxmax)
+
+
+#-----------------------------------------------------------------------------------------
+# MSD of .xyz trajectory, user box bounds are lists with None where bounds are detected, |
+# progress(fraction) callback can cancel calculation by returning False - returns None  |
+# workers > 1 splits atoms among worker processes, memory budget (bytes per process)     |
+# turns on out-of-core mode - trajectory is streamed from memory-mapped cache file,       |
+# max_lag/nlog select only some lag times (up to max_lag frames, nlog log-spaced lags),  |
+# species/groups (dict name: atom indices) add MSD of groups computed in the same pass,  |
+# blocks = number of blocks of atoms with separate MSD for bootstrap error of diffusion, |
+# stats = RunStats which gets timing of stages (see msdprofile),                        |
+# frames = slice of frames used for calculation (e.g. slice(5000, 6000) or every 10th),  |
+# origins = only every origins-th time origin is used (direct and multitau engines),     |
+# precision = storage precision of positions ("double" or "single", see xyzreader),     |
+# memo = StageMemo of session - parsed trajectory, unwrapped coordinates and result are  |
+# reused by later calls which differ only in downstream settings (see msdmemo)           |
+#-----------------------------------------------------------------------------------------
+def run_msd(fn, pbc=False, boxmin=None, boxmax=None, engine="fft", cache=None, progress=None, workers=1, memory=None,
+		max_lag=None, nlog=None, species=False, groups=None, blocks=None, stats=None, frames=None, origins=None,
+		precision="double", memo=None):
+
+	stats = stats or RunStats()
+	with stats.stage("load") as record:
+		key = None if memo is None else ("trajectory", file_identity(fn), frames_key(frames), precision, memory is not None)
+		traj = None if memo is None else memo.get(key)
+		if traj is None:
+			traj = load_trajectory(fn, cache, memory is not None, frames, workers, PRECISIONS[precision])
+			if memo is not None:
+				memo.put(key, traj)
+		record["frames"] = traj.nframes
+		record["atom_frames"] = traj.nframes*traj.natoms
+	r = traj.atom_series()
+	nt = traj.nframes
+	if nt < 2:
+		raise ValueError("Trajectory has to contain at least 2 frames for MSD calculation")
+
+	#if xyz is used with periodic boundary conditions then get rid of them (per chunk of atoms in MSD engine)
+	boxmin, boxmax, boxlen = box_settings(traj, pbc, boxmin, boxmax)
+	unwrap_box = boxlen
+
+	#unwrapped coordinates are kept in memo if they fit, MSD engine then gets them without box
+	#(out-of-core mode always unwraps per chunk, trajectory does not fit into memory)
+	if boxlen is not None and memo is not None:
+		key = (key, "unwrapped", traj.cells is not None, tuple(boxmin), tuple(boxmax))
+		unwrapped = memo.get(key)
+		if unwrapped is None and memory is None and memo.fits(8*r.size):
+			with stats.stage("unwrap") as record:
+				unwrapped = unwrap_atoms(r, boxlen)
+				record["frames"] = nt
+				record["atom_frames"] = nt*traj.natoms
+			memo.put(key, unwrapped)
+		if unwrapped is not None:
+			r, unwrap_box = unwrapped, None
+
+	#lag times, time axis is non-uniform for log-spaced lags
+	lags = select_lags(nt, max_lag, nlog)
+
+	#MSD of all atoms is the first group, others are added only if requested
+	names, membership = group_membership(traj, species, groups, blocks)
+	if memo is not None:
+		key = (key, "msd", engine, max_lag, nlog, species, tuple((name, tuple(indices)) for name, indices in (groups or {}).items()),
+			blocks, origins)
+		result = memo.get(key)
+		if result is not None:
+			return result
+
+	timing = {}
+	with stats.stage("msd") as record:
+		msd = compute_msd(r, engine, progress, unwrap_box, workers, memory, lags, membership if len(membership) > 1 else None, timing,
+			origins)
+		record["frames"] = nt
+		record["atom_frames"] = nt*traj.natoms
+	if msd is None:
+		return None
+
+	#parts of MSD stage are summed over chunks of atoms (and over worker processes)
+	for part in ("copy", "unwrap", "engine"):
+		if part != "unwrap" or unwrap_box is not None:
+			stats.add("msd." + part, timing.get(part, 0.0), record={"frames": nt, "atom_frames": nt*traj.natoms})
+
+	result = msd_result(traj, msd, lags, names, membership, engine, pbc, boxmin, boxmax, blocks, origins)
+	if memo is not None:
+		memo.put(key, result)
+	return result
+
+
+#MSDResult from MSD rows of groups (see group_membership), halves of origins are combined
+def msd_result(traj, msd, lags, names, membership, engine, pbc, boxmin, boxmax, blocks, origins):
+
+	nt = traj.nframes
+
+	#subsampled origins - MSD of both halves of origins together, halves of all atoms are kept for error
+	halves = None
+	error = None
+	if origins is not None:
+		halves = msd if len(membership) == 1 else msd[:, 0]
+		msd, _ = combine_halves(msd, nt, lags, engine, origins)
+		_, error = combine_halves(halves, nt, lags, engine, origins)
+
+	time = lag_times(traj.times, lags)
+	if len(membership) == 1:
+		return MSDResult(time, msd, traj.natoms, nt, engine, pbc, boxmin, boxmax, origin_msd=halves, origin_error=error)
+
+	ng = len(names)
+	return MSDResult(time, msd[0], traj.natoms, nt, engine, pbc, boxmin, boxmax, names[1:], msd[1:ng],
+		msd[ng:] if blocks else None, membership[ng:].sum(axis=1) if blocks else None, halves, error)
@@ -0,0 +1,107 @@
+#run statistics - wall time, CPU time, peak memory and throughput of every stage of the
+#MSD/diffusion pipeline, stages can be profiled by cProfile, report is written as JSON
+#
+#usage:
+# stats = RunStats()
+# with stats.stage("load") as record:
+#     traj = load_trajectory(fn)
+#     record["frames"] = traj.nframes
+# stats.write("profile.json")
+
+#cProfile library - used for optional profiling of selected stages
+import cProfile
+
+#json, sys and time libraries - used for report and timing
+import json
+import sys
+import time
+
+#contextmanager - stages are timed by with statement
+from contextlib import contextmanager
+
+#resource library - peak memory of process, available only on Unix
+try:
+	import resource
+except ImportError:
+	resource = None
+
+
+#peak resident set size of process (and of finished worker processes) in MB, None if not available
+def peak_rss():
+
+	if resource is None:
+		return None
+	rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+	#ru_maxrss is in bytes on macOS, in kB elsewhere
+	return rss/1024.0**2 if sys.platform == "darwin" else rss/1024.0
+
+
+#CPU time of process and of finished worker processes in seconds
+def cpu_time():
+
+	if resource is None:
+		return time.process_time()
+	usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+	return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+#------------------------------------------------------------------------------------------
+# statistics of stages of one run, profile = names of stages profiled by cProfile, their |
+# statistics are written to files profile_prefix.<stage>.prof                            |
+#------------------------------------------------------------------------------------------
+class RunStats:
+
+	def __init__(self, profile=(), profile_prefix="msdiff"):
+		self.stages = []
+		self.profile = set(profile)
+		self.profile_prefix = profile_prefix
+
+	#-------------------------------------------------------------------------------------------
+	# time stage of pipeline, record can be filled with counters "frames" and "atom_frames" |
+	# which are turned into throughput                                                      |
+	#-------------------------------------------------------------------------------------------
+	@contextmanager
+	def stage(self, name):
+
+		record = {"name": name}
+		profiler = cProfile.Profile() if name in self.profile else None
+		wall = time.perf_counter()
+		cpu = cpu_time()
+		if profiler is not None:
+			profiler.enable()
+		try:
+			yield record
+		finally:
+			if profiler is not None:
+				profiler.disable()
+				profiler.dump_stats("{}.{}.prof".format(self.profile_prefix, name))
+			self.add(name, time.perf_counter() - wall, cpu_time() - cpu, record)
+
+	#stage measured elsewhere (e.g. summed over chunks of atoms in worker processes)
+	def add(self, name, wall, cpu=None, record=None):
+
+		record = dict(record or {}, name=name, wall=wall, cpu=cpu, peak_rss_mb=peak_rss())
+		for counter in ("frames", "atom_frames"):
+			if counter in record and wall > 0.0:
+				record[counter + "_per_s"] = record[counter]/wall
+		self.stages.append(record)
+
+	def to_dict(self):
+		return {"stages": self.stages, "wall": sum(s["wall"] for s in self.stages if "." not in s["name"]),
+			"peak_rss_mb": peak_rss()}
+
+	def write(self, fn):
+		with open(fn, "w") as fout:
+			json.dump(self.to_dict(), fout, indent=1)
+
+	#human readable table of stages (GUI panel)
+	def summary(self):
+
+		lines = ["{:<16}{:>10}{:>10}{:>12}{:>16}".format("stage", "wall [s]", "cpu [s]", "peak [MB]", "frames/s")]
+		for s in self.stages:
+			lines.append("{:<16}{:>10.3f}{:>10}{:>12}{:>16}".format(s["name"], s["wall"],
+				"" if s["cpu"] is None else "{:.3f}".format(s["cpu"]),
+				"" if s["peak_rss_mb"] is None else "{:.1f}".format(s["peak_rss_mb"]),
+				"{:.1f}".format(s["frames_per_s"]) if "frames_per_s" in s else ""))
+		return "\n".join(lines)
@@ -0,0 +1,123 @@
+#periodic boundary conditions - box detection and unwrapping of coordinates stored
+#in numpy array with shape (natoms, nt, 3)
+#
+#box is either fixed orthorhombic box given by box lengths (3,) or per-frame cells (nt, 3, 3)
+#from extended XYZ headers, rows of cell are lattice vectors a, b, c (also triclinic) - with
+#cells the displacement between consecutive frames is taken in fractional coordinates of
+#the later cell and wrapped to minimum image, so box changes of NPT simulations do not
+#produce spurious jumps
+
+#numpy library
+import numpy as np
+
+
+#------------------------------------------------------------------------------
+# automatic box detection - min and max particle coordinates in every dimension |
+#------------------------------------------------------------------------------
+def box_bounds(r):
+
+	r = np.asarray(r)
+	return r.min(axis=(0,1)), r.max(axis=(0,1))
+
+
+#------------------------------------------------------------------------------------
+# box lenghts from bounds, user values (None = not specified) override detected ones |
+#------------------------------------------------------------------------------------
+def box_length(boxmin, boxmax, user_boxmin=None, user_boxmax=None):
+
+	boxmin = np.array(boxmin, dtype=np.float64)
+	boxmax = np.array(boxmax, dtype=np.float64)
+	for idim in range(3):
+		if user_boxmin is not None and user_boxmin[idim] is not None:
+			boxmin[idim] = user_boxmin[idim]
+		if user_boxmax is not None and user_boxmax[idim] is not None:
+			boxmax[idim] = user_boxmax[idim]
+	return boxmax - boxmin
+
+
+#number of box lenghts to add in every dimension for displacements between consecutive frames -
+#particle which moved at least half of the box crossed the boundary
+def box_jumps(dr, boxlen):
+	return np.where(np.abs(dr) >= np.asarray(boxlen)/2.0, -np.sign(dr), 0.0)
+
+
+#------------------------------------------------------------------------------------------
+# displacements dr (nt, ..., 3) wrapped to minimum image of per-frame cells (nt, 3, 3) - |
+# particle which moved at least half of the cell in fractional coordinates crossed the    |
+# boundary                                                                                |
+#------------------------------------------------------------------------------------------
+def cell_min_image(dr, cells):
+
+	cells = np.asarray(cells, dtype=np.float64)
+	ds = np.matmul(dr, np.linalg.inv(cells))
+	ds += box_jumps(ds, 1.0)
+	return np.matmul(ds, cells)
+
+
+#------------------------------------------------------------------------------------------
+# get rid of periodic boundary conditions - particle which moved at least half of the box |
+# between two configurations crossed the boundary, jumps are accumulated by cumulative sum |
+# boxlen = box lengths (3,) or per-frame cells (nt, 3, 3), unwrapped positions with cells  |
+# are the first position plus cumulative sum of minimum image displacements               |
+#------------------------------------------------------------------------------------------
+def unwrap(r, boxlen):
+
+	r = np.asarray(r, dtype=np.float64)
+	boxlen = np.asarray(boxlen, dtype=np.float64)
+	if boxlen.ndim == 3:
+		du = cell_min_image(np.diff(r, axis=1).swapaxes(0, 1), boxlen[1:]).swapaxes(0, 1)
+		out = np.empty_like(r)
+		out[:, 0] = r[:, 0]
+		np.cumsum(du, axis=1, out=out[:, 1:])
+		out[:, 1:] += r[:, :1]
+		return out
+
+	jumps = box_jumps(np.diff(r, axis=1), boxlen)
+	shift = np.zeros_like(r)
+	np.cumsum(jumps, axis=1, out=shift[:, 1:, :])
+	return r + shift*boxlen
+
+
+#------------------------------------------------------------------------------------------
+# incremental unwrapping of frame-major blocks of positions (nfr, natoms, 3) - the last  |
+# frame, box jumps and unwrapped position are carried between blocks (follow mode, export |
+# of memory-mapped trajectory), cells = per-frame cells of block instead of box lengths  |
+#------------------------------------------------------------------------------------------
+class FrameUnwrapper:
+
+	def __init__(self, boxlen=None):
+		self.boxlen = None if boxlen is None else np.asarray(boxlen, dtype=np.float64)
+		self.last = None
+		self.shift = None
+		self.unwrapped = None
+
+	def add(self, r, cells=None):
+
+		r = np.asarray(r, dtype=np.float64)
+		if self.last is None:
+			self.last = r[:1]
+			self.shift = np.zeros_like(self.last)
+			self.unwrapped = r[:1]
+		dr = np.diff(np.concatenate((self.last, r)), axis=0)
+		self.last = r[-1:]
+		if cells is not None:
+			u = self.unwrapped + np.cumsum(cell_min_image(dr, cells), axis=0)
+		else:
+			shift = self.shift + np.cumsum(box_jumps(dr, self.boxlen), axis=0)
+			self.shift = shift[-1:]
+			u = r + shift*self.boxlen
+		self.unwrapped = u[-1:]
+		return u
+
+
+#---------------------------------------------------------------------------------------------
+# unwrapping of frame-major positions (nframes, natoms, 3) in blocks of frames - yields      |
+# (first frame, unwrapped block), so the whole trajectory never has to be in memory,        |
+# boxlen = box lengths (3,) or per-frame cells (nframes, 3, 3)                               |
+#---------------------------------------------------------------------------------------------
+def unwrap_frames(positions, boxlen, block=1024):
+
+	cells = boxlen if np.ndim(boxlen) == 3 else None
+	unwrapper = FrameUnwrapper(None if cells is not None else boxlen)
+	for it in range(0, len(positions), block):
+		yield it, unwrapper.add(positions[it:it+block], None if cells is None else cells[it:it+block])
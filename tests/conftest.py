@@ -0,0 +1,5 @@
+#modules of application are in repository root, tests are run from any directory
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+#MSD engines have to agree with direct calculation within floating-point tolerance
+
+import numpy as np
+
+from msdengine import msd_direct_atoms, msd_fft_atoms, compute_msd
+from pbc import unwrap
+
+
+BOX = np.array([5.0, 6.0, 7.0])
+
+
+#seeded random walk (natoms, nt, 3), wrapped into BOX if requested
+def random_walk(natoms=7, nt=120, wrapped=False, seed=1):
+	rng = np.random.default_rng(seed)
+	r = rng.uniform(0.0, 5.0, (natoms, 1, 3)) + np.cumsum(rng.normal(0.0, 0.3, (natoms, nt, 3)), axis=1)
+	return r % BOX if wrapped else r
+
+
+def test_fft_matches_direct():
+	r = random_walk()
+	np.testing.assert_allclose(msd_fft_atoms(r), msd_direct_atoms(r), rtol=1e-10, atol=1e-12)
+
+
+def test_fft_matches_direct_after_unwrap():
+	r = unwrap(random_walk(wrapped=True), BOX)
+	np.testing.assert_allclose(msd_fft_atoms(r), msd_direct_atoms(r), rtol=1e-10, atol=1e-12)
+
+
+def test_unwrap_restores_walk():
+	r = random_walk()
+	u = unwrap(random_walk(wrapped=True), BOX)
+	np.testing.assert_allclose(u - u[:, :1], r - r[:, :1], atol=1e-9)
+
+
+def test_compute_msd_engines_agree():
+	wrapped = random_walk(wrapped=True)
+	for boxlen in (None, BOX):
+		r = wrapped if boxlen is not None else random_walk()
+		direct = compute_msd(r, "direct", boxlen=boxlen)
+		np.testing.assert_allclose(compute_msd(r, "fft", boxlen=boxlen), direct, rtol=1e-10, atol=1e-12)
+		np.testing.assert_allclose(direct, msd_direct_atoms(unwrap(r, boxlen) if boxlen is not None else r).mean(axis=0),
+			rtol=1e-10, atol=1e-12)
+
+
+#partial sums are reduced in chunk order, so number of workers does not change the result
+def test_compute_msd_workers_identical():
+	wrapped = random_walk(natoms=40, nt=80, wrapped=True)
+	groups = (np.arange(40)[None] % 3 == np.arange(3)[:, None]).astype(np.float64)
+	for boxlen in (None, BOX):
+		for membership in (None, groups):
+			serial = compute_msd(wrapped, "fft", boxlen=boxlen, workers=1, groups=membership, memory=40*80*3*8*4)
+			parallel = compute_msd(wrapped, "fft", boxlen=boxlen, workers=3, groups=membership, memory=40*80*3*8*4)
+			np.testing.assert_array_equal(parallel, serial)
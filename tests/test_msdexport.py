@@ -0,0 +1,36 @@
+#exports of per-atom MSD and unwrapped trajectory - failed export leaves no partial file
+
+import os
+
+import numpy as np
+import pytest
+
+import msdexport
+from msdbench import write_trajectory
+
+
+@pytest.mark.parametrize("ext", [".npy", ".npz", ".h5", ".txt"])
+def test_failed_export_is_removed(tmp_path, monkeypatch, ext):
+	if ext == ".h5":
+		pytest.importorskip("h5py")
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 5, 40)
+
+	def failing_msd(r, out, *args, **kwargs):
+		out[:2] = 1.0
+		raise MemoryError("out of memory")
+
+	monkeypatch.setattr(msdexport, "atom_msd", failing_msd)
+	with pytest.raises(MemoryError):
+		msdexport.export_atom_msd(str(tmp_path / ("atoms" + ext)), fn)
+	assert os.listdir(str(tmp_path)) == ["walk.xyz"]
+
+
+def test_export_atom_msd(tmp_path):
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 5, 40)
+	fnout = str(tmp_path / "atoms.npz")
+	msdexport.export_atom_msd(fnout, fn)
+	with np.load(fnout) as data:
+		assert data["atom_msd"].shape == (5, 39)
+		assert data["time"].shape == (39,)
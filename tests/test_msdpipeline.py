@@ -0,0 +1,48 @@
+#MSD pipeline - frame selection and precision of stored coordinates
+
+import numpy as np
+
+from msdbench import write_trajectory
+from msdpipeline import run_msd
+
+
+def test_frame_selection_lag_times(tmp_path):
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 10, 60, pbc=True)
+	first = run_msd(fn, pbc=True, frames=slice(0, 30))
+	later = run_msd(fn, pbc=True, frames=slice(20, 50))
+	assert later.time[0] == 0.0
+	np.testing.assert_allclose(later.time, first.time)
+
+
+#README (Storage precision) states relative MSD difference of single and double precision storage below 1e-7
+def test_single_precision_matches_double(tmp_path):
+	from msdbench import BOX_LENGTH
+	from msdengine import compute_msd
+	from xyzreader import read_xyz
+
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 50, 1000, pbc=True)
+	for boxlen in (np.full(3, BOX_LENGTH), None):
+		double, single = [compute_msd(read_xyz(fn, dtype=dtype).atom_series(), "fft", boxlen=boxlen) for dtype in (np.float64, np.float32)]
+		np.testing.assert_allclose(single[1:], double[1:], rtol=1e-7)
+
+	double, single = [run_msd(fn, pbc=True, precision=precision).msd for precision in ("double", "single")]
+	np.testing.assert_allclose(single[1:], double[1:], rtol=1e-7)
+
+
+#out-of-core mode streams trajectory into cache file and computes MSD in chunks fitting into budget
+def test_memory_budget_matches_in_memory(tmp_path):
+	from msdengine import atom_bytes
+	from trajcache import TrajectoryCache
+
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 30, 200, pbc=True)
+	budget = 7*atom_bytes(200, "fft")
+	for pbc in (False, True):
+		reference = run_msd(fn, pbc=pbc)
+		for workers in (1, 2):
+			cache = TrajectoryCache(str(tmp_path / "cache{}{}".format(pbc, workers)))
+			result = run_msd(fn, pbc=pbc, cache=cache, memory=budget, workers=workers)
+			np.testing.assert_allclose(result.msd, reference.msd, rtol=1e-12)
+			assert isinstance(cache.get(fn).positions, np.memmap)
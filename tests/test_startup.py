@@ -0,0 +1,11 @@
+#start of command line interface imports only numpy of heavy packages (see msdbench --startup)
+
+from msdbench import check_startup, STARTUP_BUDGET_MS
+
+
+#twice the budget of msdbench - margin for loaded test machines, a heavy import beyond numpy
+#(scipy, matplotlib, PyQt5) alone takes more than that
+def test_startup_import_budget():
+	res = check_startup(budget=2*STARTUP_BUDGET_MS, runs=3)
+	assert res["forbidden"] == []
+	assert res["beyond_numpy_ms"] <= res["budget_ms"]
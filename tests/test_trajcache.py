@@ -0,0 +1,84 @@
+#binary cache of parsed trajectories - round trip and concurrent writers of one entry
+
+import os
+import threading
+
+import numpy as np
+
+from msdbench import write_trajectory
+from trajcache import TrajectoryCache
+from xyzreader import read_xyz
+
+
+def test_cache_round_trip(tmp_path):
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 5, 40, pbc=True)
+	cache = TrajectoryCache(str(tmp_path / "cache"))
+	traj = read_xyz(fn)
+	cache.put(fn, traj)
+	cached = cache.get(fn)
+	np.testing.assert_array_equal(cached.positions, traj.positions)
+	np.testing.assert_array_equal(cached.times, traj.times)
+	assert not [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+
+def test_concurrent_writers(tmp_path):
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 20, 300)
+	cache = TrajectoryCache(str(tmp_path / "cache"))
+	traj = read_xyz(fn)
+	errors = []
+
+	def write(put, *args):
+		try:
+			put(fn, *args)
+		except Exception as e:
+			errors.append(e)
+
+	writers = [threading.Thread(target=write, args=(cache.put_stream,)) for _ in range(4)]
+	writers += [threading.Thread(target=write, args=(cache.put, traj)) for _ in range(4)]
+	for writer in writers:
+		writer.start()
+	for writer in writers:
+		writer.join()
+	assert errors == []
+	np.testing.assert_array_equal(cache.get(fn).positions, traj.positions)
+	assert not [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+
+def test_frame_selection_parses_only_selected(tmp_path, monkeypatch):
+	import xyzindex
+	import xyzreader
+	from trajcache import load_trajectory
+
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 5, 400)
+	parsed = []
+
+	def spy(parse):
+		def parse_frames(lines, natoms, nfr, *args):
+			parsed.append(nfr)
+			return parse(lines, natoms, nfr, *args)
+		return parse_frames
+
+	monkeypatch.setattr(xyzindex, "parse_frames", spy(xyzindex.parse_frames))
+	monkeypatch.setattr(xyzreader, "parse_frames", spy(xyzreader.parse_frames))
+	cache = TrajectoryCache(str(tmp_path / "cache"))
+	traj = load_trajectory(fn, cache, frames=slice(None, None, 50))
+	assert traj.nframes == 8 and sum(parsed) == 8
+	assert cache.get(fn) is None
+
+
+def test_cached_and_uncached_selection_agree(tmp_path):
+	from msdpipeline import run_msd
+
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 6, 300, pbc=True, seed=2)
+	frames = slice(100, 280, 3)
+	uncached = run_msd(fn, True, frames=frames)
+	cache = TrajectoryCache(str(tmp_path / "cache"))
+	run_msd(fn, True, cache=cache)
+	cached = run_msd(fn, True, cache=cache, frames=frames)
+	assert cached.boxmin == uncached.boxmin and cached.boxmax == uncached.boxmax
+	np.testing.assert_array_equal(cached.time, uncached.time)
+	np.testing.assert_allclose(cached.msd, uncached.msd, rtol=1e-12)
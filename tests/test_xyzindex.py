@@ -0,0 +1,57 @@
+#frame index - selected frames and parallel parsing into memory-mapped output
+
+import gc
+import os
+
+import numpy as np
+
+from msdbench import write_trajectory
+from xyzindex import index_path, load_index, read_frames
+from xyzreader import read_xyz
+
+
+def test_parallel_parsing(tmp_path, monkeypatch):
+	monkeypatch.setenv("TMPDIR", str(tmp_path))
+	monkeypatch.setattr("tempfile.tempdir", None)
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 6, 50)
+	ref = read_xyz(fn)
+
+	traj = read_frames(fn, slice(3, 40, 2), workers=2, save_index=False)
+	np.testing.assert_array_equal(traj.positions, ref.positions[3:40:2])
+	np.testing.assert_array_equal(traj.times, ref.times[3:40:2])
+	assert isinstance(traj.positions, np.memmap)
+
+	#temporary output file lives as long as positions
+	outputs = lambda: [name for name in os.listdir(str(tmp_path)) if name.startswith("msdiff.")]
+	assert len(outputs()) == 1
+	del traj
+	gc.collect()
+	assert outputs() == []
+
+
+def test_no_trailing_newline(tmp_path):
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 6, 30)
+	with open(fn, "rb+") as fout:
+		fout.truncate(os.path.getsize(fn) - 1)
+
+	ref = read_xyz(fn)
+	serial = read_frames(fn, save_index=False)
+	parallel = read_frames(fn, workers=2, save_index=False)
+	assert ref.nframes == serial.nframes == parallel.nframes == 30
+	np.testing.assert_array_equal(serial.positions, ref.positions)
+	np.testing.assert_array_equal(parallel.positions, ref.positions)
+
+
+def test_damaged_sidecar_is_rebuilt(tmp_path):
+	fn = str(tmp_path / "walk.xyz")
+	write_trajectory(fn, 6, 30)
+	index = load_index(fn)
+	with open(index_path(fn), "rb+") as fout:
+		fout.truncate(os.path.getsize(index_path(fn)) // 2)
+
+	rebuilt = load_index(fn)
+	np.testing.assert_array_equal(rebuilt.offsets, index.offsets)
+	assert sorted(os.listdir(str(tmp_path))) == ["walk.xyz", "walk.xyz.index.npz"]
+	np.testing.assert_array_equal(load_index(fn, save=False).offsets, index.offsets)
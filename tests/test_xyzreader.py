@@ -0,0 +1,112 @@
+#parsing of .xyz files - follow mode on file which is still being written
+
+import numpy as np
+
+import msdcli
+from msdbench import write_trajectory, BOX_LENGTH
+from msdengine import compute_msd
+from msdfollow import MSDFollower
+from msdpipeline import run_msd
+from pbc import unwrap
+from xyzreader import iter_xyz, read_xyz
+
+
+FRAMES = "".join("2\ntime = {}\nC {} 0.0 0.0\nO 0.0 {} 1.0\n".format(it, 0.1*it, 0.2*it) for it in range(8))
+
+
+def test_follow_partial_line(tmp_path):
+	fn = str(tmp_path / "growing.xyz")
+	cut = FRAMES.index("C 0.3") + 3
+	with open(fn, "w") as fout:
+		fout.write(FRAMES[:cut])
+
+	frames = iter_xyz(fn, follow=True)
+	xyz, t, _, offset = next(frames)
+	nt = len(t)
+
+	#simulation appends the rest of the file while reader is active
+	with open(fn, "a") as fout:
+		fout.write(FRAMES[cut:])
+	for xyz, t, _, offset in frames:
+		nt += len(t)
+	assert nt == 3
+
+	#next poll continues from returned offset
+	nt += sum(len(t) for _, t, _, _ in iter_xyz(fn, offset=offset, first_frame=nt, follow=True))
+	assert nt == 8
+
+
+def test_follower_growing_file(tmp_path):
+	fn = str(tmp_path / "growing.xyz")
+	follower = MSDFollower(fn)
+	with open(fn, "w") as fout:
+		for piece in range(0, len(FRAMES), 23):
+			fout.write(FRAMES[piece:piece+23])
+			fout.flush()
+			follower.poll()
+	result = follower.poll() or follower.result()
+	traj = read_xyz(fn)
+	assert follower.nframes == traj.nframes == 8
+	np.testing.assert_allclose(result.time, traj.times[:-1])
+
+
+def test_follower_seeded_by_fft(tmp_path):
+	full = str(tmp_path / "full.xyz")
+	write_trajectory(full, 7, 90, pbc=True, seed=3)
+	lines = open(full).read().splitlines(keepends=True)
+	box = dict(boxmin=[0.0]*3, boxmax=[BOX_LENGTH]*3)
+
+	#the first update sees 60 frames (FFT pass), the second one 30 appended frames (pair updates)
+	fn = str(tmp_path / "growing.xyz")
+	for max_lag in (None, 25):
+		follower = MSDFollower(fn, True, max_lag=max_lag, **box)
+		for nt, cut in ((60, 60*9), (90, len(lines))):
+			with open(fn, "w") as fout:
+				fout.writelines(lines[:cut])
+			result = follower.poll()
+			expected = run_msd(fn, True, engine="direct", max_lag=max_lag, **box)
+			assert follower.nframes == nt
+			np.testing.assert_allclose(result.time, expected.time)
+			np.testing.assert_allclose(result.msd, expected.msd, rtol=1e-9, atol=1e-12)
+
+
+def test_follow_rejects_batch_options(tmp_path, capsys):
+	fn = str(tmp_path / "growing.xyz")
+	with open(fn, "w") as fout:
+		fout.write(FRAMES)
+	for option in (["--engine", "direct"], ["--workers", "2"], ["--precision", "single"], ["--frames", "::2"],
+			["--stride", "2"], ["--memory-budget", "10"]):
+		args = msdcli.build_parser().parse_args(["--headless", fn, "--follow", "1"] + option)
+		assert msdcli.run(args) == 2
+		assert "not available in follow mode" in capsys.readouterr().err
+
+
+def test_extended_xyz_triclinic_unwrap(tmp_path):
+	#walkers in static triclinic cell, steps are much shorter than half of the cell
+	cell = np.array([[10.0, 0.0, 0.0], [3.0, 9.0, 0.0], [2.0, 1.0, 8.0]])
+	rng = np.random.default_rng(5)
+	path = np.cumsum(rng.normal(0.0, 0.7, (40, 4, 3)), axis=0) + rng.uniform(0.0, 8.0, (4, 3))
+	frac = path @ np.linalg.inv(cell)
+	wrapped = (frac - np.floor(frac)) @ cell
+	assert not np.allclose(wrapped, path)
+
+	#Properties with columns before and after positions, quoted Time
+	fn = str(tmp_path / "triclinic.xyz")
+	lattice = " ".join("{:.1f}".format(v) for v in cell.ravel())
+	with open(fn, "w") as fout:
+		for it, frame in enumerate(wrapped):
+			fout.write("4\nLattice=\"{}\" Properties=id:I:1:species:S:1:pos:R:3:vel:R:3 Time=\"{}\" pbc=\"T T T\"\n".format(lattice, 0.5*it))
+			for ia, (x, y, z) in enumerate(frame):
+				fout.write("{} {} {:.10f} {:.10f} {:.10f} 0.1 -0.2 0.3\n".format(ia+1, "CO"[ia % 2], x, y, z))
+
+	traj = read_xyz(fn)
+	np.testing.assert_allclose(traj.positions, wrapped, atol=1e-9)
+	np.testing.assert_array_equal(traj.times, 0.5*np.arange(40))
+	np.testing.assert_array_equal(traj.cells, np.broadcast_to(cell, (40, 3, 3)))
+	assert traj.species == ["C", "O"] and traj.types.tolist() == [0, 1, 0, 1]
+
+	#unwrapped path is the known one shifted by lattice vectors of the first frame
+	unwrapped = unwrap(traj.atom_series(), traj.cells).swapaxes(0, 1)
+	np.testing.assert_allclose(unwrapped - unwrapped[:1], path - path[:1], atol=1e-8)
+	result = run_msd(fn, True, engine="direct")
+	np.testing.assert_allclose(result.msd, compute_msd(path.swapaxes(0, 1), "direct"), rtol=1e-9)
@@ -0,0 +1,60 @@
+#compressed trajectories - every format is parsed to the same positions as plain file
+
+import bz2
+import gzip
+import lzma
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from msdbench import write_trajectory
+from xyzstream import detect_compression, is_bgzf
+from xyzreader import read_xyz
+
+
+#BGZF - gzip members of at most chunk bytes (more members than one batch of threads) with extra field "BC" (size of member), empty member at end
+def bgzf_compress(data, chunk=256):
+
+	out = []
+	for start in range(0, len(data) + 1, chunk):
+		block = data[start:start+chunk]
+		deflate = zlib.compressobj(6, zlib.DEFLATED, -15)
+		comp = deflate.compress(block) + deflate.flush()
+		size = 12 + 6 + len(comp) + 8
+		out.append(b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff" + struct.pack("<H", 6) + b"BC" + struct.pack("<HH", 2, size - 1)
+			+ comp + struct.pack("<II", zlib.crc32(block), len(block)))
+	return b"".join(out)
+
+
+def zstd_compress(data):
+	zstandard = pytest.importorskip("zstandard")
+	return zstandard.ZstdCompressor().compress(data)
+
+
+COMPRESSORS = {
+	"gzip": gzip.compress,
+	"bz2": bz2.compress,
+	"xz": lzma.compress,
+	"bgzf": bgzf_compress,
+	"zstd": zstd_compress,
+}
+
+
+@pytest.mark.parametrize("name", sorted(COMPRESSORS))
+def test_compressed_round_trip(tmp_path, name):
+	plain = str(tmp_path / "plain.xyz")
+	write_trajectory(plain, 20, 50, seed=4)
+	with open(plain, "rb") as fin:
+		data = fin.read()
+	fn = str(tmp_path / "traj.xyz.{}".format(name))
+	with open(fn, "wb") as fout:
+		fout.write(COMPRESSORS[name](data))
+
+	assert detect_compression(fn) == ("gzip" if name == "bgzf" else name)
+	assert is_bgzf(fn) == (name == "bgzf")
+	expected = read_xyz(plain)
+	traj = read_xyz(fn)
+	np.testing.assert_array_equal(traj.positions, expected.positions)
+	np.testing.assert_array_equal(traj.times, expected.times)
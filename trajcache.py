@@ -0,0 +1,283 @@
+#persistent cache of parsed trajectories - positions are stored in binary .npy files which
+#are memory-mapped on later loads, small .json sidecar keeps metadata of cache entry
+#
+#entry is keyed on path, size, modification time and content hash of .xyz file and on
+#storage precision of positions, the cache is bounded in size and least recently used
+#entries are evicted, per-frame cells of extended XYZ files are stored in .cells.npy
+
+#libraries used for files, hashing and metadata
+import os
+import json
+import time
+import struct
+import hashlib
+import tempfile
+
+#contextmanager - files of cache entry are written by with statement
+from contextlib import contextmanager
+
+#numpy library
+import numpy as np
+
+#trajectory reader
+from xyzreader import Trajectory, read_xyz, iter_xyz, read_types, join_cells
+from xyzindex import read_frames
+from xyzstream import detect_compression
+
+
+#default cache directory and size limit, can be changed by environment variables
+CACHE_DIR = os.environ.get("MSDIFF_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "msdiff"))
+CACHE_MAX_BYTES = int(os.environ.get("MSDIFF_CACHE_MAX_BYTES", 20*1024**3))
+
+#number of bytes hashed at the beginning and at the end of file
+HASH_BYTES = 1 << 20
+
+#length of .npy header reserved before positions which are streamed to cache file
+NPY_HEADER_BYTES = 128
+
+
+#-----------------------------------------------------------------------------------------
+# content hash - beginning and end of file, hashing whole multi-GB file would cost as much |
+# as parsing, changes in the middle of file are detected by size and modification time   |
+#-----------------------------------------------------------------------------------------
+def content_hash(fn, size):
+
+	h = hashlib.blake2b(digest_size=16)
+	with open(fn, "rb") as fin:
+		h.update(fin.read(HASH_BYTES))
+		if size > HASH_BYTES:
+			fin.seek(max(HASH_BYTES, size - HASH_BYTES))
+			h.update(fin.read(HASH_BYTES))
+	return h.hexdigest()
+
+
+#.npy header of little-endian array padded to fixed length - header is written after data of unknown length
+def npy_header(shape, dtype=np.float64, length=NPY_HEADER_BYTES):
+
+	descr = np.dtype(dtype).newbyteorder("<").str
+	header = "{{'descr': '{}', 'fortran_order': False, 'shape': {}, }}".format(descr, tuple(shape))
+	prefix = np.lib.format.magic(1, 0)
+	hlen = length - len(prefix) - 2
+	return prefix + struct.pack("<H", hlen) + header.ljust(hlen-1).encode("latin1") + b"\n"
+
+
+#---------------------------------------------------------------------------------------------
+# file written to unique temporary file in the same directory and renamed to path when      |
+# complete - concurrent writers of the same entry (e.g. batch jobs loading one trajectory)   |
+# never share temporary file, so path is always a complete file of one of them              |
+#---------------------------------------------------------------------------------------------
+@contextmanager
+def replace_file(path, mode="wb"):
+
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+	try:
+		with os.fdopen(fd, mode) as fout:
+			yield fout
+		os.replace(tmp, path)
+	except BaseException:
+		try:
+			os.remove(tmp)
+		except OSError:
+			pass
+		raise
+
+
+#identity of trajectory file - (path, size, mtime, content hash)
+def file_identity(fn):
+
+	path = os.path.abspath(fn)
+	st = os.stat(path)
+	return path, st.st_size, st.st_mtime_ns, content_hash(path, st.st_size)
+
+
+class TrajectoryCache:
+
+	def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+		self.directory = directory
+		self.max_bytes = max_bytes
+
+	#double precision entries keep key of identity only, other precisions are stored separately
+	def key(self, identity, dtype=np.float64):
+		text = repr(identity)
+		if np.dtype(dtype) != np.float64:
+			text += np.dtype(dtype).str
+		return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+	def paths(self, key):
+		base = os.path.join(self.directory, key)
+		return base + ".json", base + ".positions.npy", base + ".times.npy"
+
+	def cells_path(self, fmeta):
+		return fmeta[:-len(".json")] + ".cells.npy"
+
+	#-------------------------------------------------------------------
+	# memory-mapped trajectory from cache or None if there is no entry |
+	#-------------------------------------------------------------------
+	def get(self, fn, dtype=np.float64):
+
+		identity = file_identity(fn)
+		fmeta, fpos, ftimes = self.paths(self.key(identity, dtype))
+		try:
+			with open(fmeta) as fin:
+				meta = json.load(fin)
+			if meta["identity"] != list(identity):
+				return None
+			positions = np.load(fpos, mmap_mode="r")
+			times = np.load(ftimes)
+			bounds = (np.array(meta["boxmin"]), np.array(meta["boxmax"]))
+			cells = np.load(self.cells_path(fmeta)) if meta["cells"] else None
+		except (OSError, ValueError, KeyError):
+			return None
+
+		#least recently used bookkeeping
+		meta["last_used"] = time.time()
+		try:
+			self.write_meta(fmeta, meta)
+		except OSError:
+			pass
+		types, species = read_types(fn)
+		return Trajectory(positions, times, bounds, types, species, cells)
+
+	#------------------------------------------------------------
+	# store parsed trajectory and evict least recently used ones |
+	#------------------------------------------------------------
+	def put(self, fn, traj):
+
+		identity = file_identity(fn)
+		dtype = traj.positions.dtype
+		fmeta, fpos, ftimes = self.paths(self.key(identity, dtype))
+		os.makedirs(self.directory, exist_ok=True)
+
+		#binary files are written first, metadata sidecar marks complete entry
+		with replace_file(fpos, "wb") as fout:
+			np.save(fout, np.ascontiguousarray(traj.positions))
+		self.finish(identity, traj.times, traj.natoms, traj.box_bounds(), dtype, traj.cells)
+
+	#---------------------------------------------------------------------------------------
+	# parse .xyz file block by block directly into cache file, trajectory is never held in |
+	# memory as a whole (out-of-core mode) - returns memory-mapped trajectory of dtype    |
+	#---------------------------------------------------------------------------------------
+	def put_stream(self, fn, dtype=np.float64):
+
+		identity = file_identity(fn)
+		fmeta, fpos, ftimes = self.paths(self.key(identity, dtype))
+		os.makedirs(self.directory, exist_ok=True)
+
+		times = []
+		cells = []
+		nt = 0
+		boxmin = np.full(3, np.inf)
+		boxmax = np.full(3, -np.inf)
+		with replace_file(fpos, "wb") as fout:
+			fout.write(bytes(NPY_HEADER_BYTES))
+			for xyz, t, cell, _ in iter_xyz(fn, dtype=dtype):
+				fout.write(xyz.astype(np.dtype(dtype).newbyteorder("<"), copy=False).tobytes())
+				times.append(t)
+				cells.append(cell)
+				nt += xyz.shape[0]
+				natoms = xyz.shape[1]
+				boxmin = np.minimum(boxmin, xyz.min(axis=(0,1)))
+				boxmax = np.maximum(boxmax, xyz.max(axis=(0,1)))
+			fout.seek(0)
+			fout.write(npy_header((nt, natoms, 3), dtype))
+
+		times = np.concatenate(times)
+		cells = join_cells(cells)
+		self.finish(identity, times, natoms, (boxmin, boxmax), dtype, cells)
+		types, species = read_types(fn)
+		return Trajectory(np.load(fpos, mmap_mode="r"), times, (boxmin, boxmax), types, species, cells)
+
+	#frame times, cells and metadata sidecar which marks complete entry
+	def finish(self, identity, times, natoms, bounds, dtype=np.float64, cells=None):
+
+		fmeta, fpos, ftimes = self.paths(self.key(identity, dtype))
+		with replace_file(ftimes, "wb") as fout:
+			np.save(fout, times)
+		nbytes = os.path.getsize(fpos) + os.path.getsize(ftimes)
+		if cells is not None:
+			fcells = self.cells_path(fmeta)
+			with replace_file(fcells, "wb") as fout:
+				np.save(fout, np.asarray(cells, dtype=np.float64))
+			nbytes += os.path.getsize(fcells)
+		meta = {
+			"identity": list(identity),
+			"natoms": natoms,
+			"nframes": len(times),
+			"dtype": np.dtype(dtype).str,
+			"boxmin": [float(b) for b in bounds[0]],
+			"boxmax": [float(b) for b in bounds[1]],
+			"cells": cells is not None,
+			"nbytes": nbytes,
+			"last_used": time.time(),
+		}
+		self.write_meta(fmeta, meta)
+		self.evict(keep=fmeta)
+
+	def write_meta(self, fmeta, meta):
+		with replace_file(fmeta, "w") as fout:
+			json.dump(meta, fout)
+
+	#remove least recently used entries until cache fits into max_bytes
+	def evict(self, keep=None):
+
+		entries = []
+		for name in os.listdir(self.directory):
+			if not name.endswith(".json"):
+				continue
+			fmeta = os.path.join(self.directory, name)
+			try:
+				with open(fmeta) as fin:
+					meta = json.load(fin)
+				entries.append((meta["last_used"], meta["nbytes"], fmeta))
+			except (OSError, ValueError, KeyError):
+				continue
+
+		total = sum(nbytes for _, nbytes, _ in entries)
+		for _, nbytes, fmeta in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			if fmeta == keep:
+				continue
+			self.remove(fmeta[:-len(".json")])
+			total -= nbytes
+
+	def remove(self, base):
+		for path in (base + ".json", base + ".positions.npy", base + ".times.npy", base + ".cells.npy"):
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+
+
+#------------------------------------------------------------------------------------------
+# load trajectory - cached binary copy is used if exists, otherwise .xyz is parsed,       |
+# with stream=True the .xyz file is parsed directly into cache file (out-of-core mode),  |
+# frames = slice of frames, workers > 1 parses plain .xyz file by worker processes       |
+# (frame index, see xyzindex), only selected frames of plain .xyz file are parsed unless |
+# trajectory is already cached - partial parse does not fill cache (quick preview of    |
+# huge file), positions are stored with precision dtype (float64 or float32)           |
+#------------------------------------------------------------------------------------------
+def load_trajectory(fn, cache=None, stream=False, frames=None, workers=1, dtype=np.float64):
+
+	plain = detect_compression(fn) is None
+	if cache is None:
+		if stream:
+			raise ValueError("Out-of-core calculation needs trajectory cache, it can not be used with --no-cache")
+		if plain and (workers > 1 or frames is not None):
+			return read_frames(fn, frames, workers, dtype=dtype)
+		traj = read_xyz(fn, dtype=dtype)
+		return traj if frames is None else traj.select(frames)
+
+	traj = cache.get(fn, dtype)
+	if traj is None and plain and frames is not None and not stream:
+		return read_frames(fn, frames, workers, dtype=dtype)
+	if traj is None and stream:
+		traj = cache.put_stream(fn, dtype)
+	if traj is None:
+		traj = read_frames(fn, workers=workers, dtype=dtype) if plain and workers > 1 else read_xyz(fn, dtype=dtype)
+		try:
+			cache.put(fn, traj)
+		except OSError:
+			#cache is optimization only, e.g. read-only home directory must not stop calculation
+			pass
+	return traj if frames is None else traj.select(frames)
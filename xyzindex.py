@@ -0,0 +1,208 @@
+#frame index of .xyz file - byte offsets of all frames found from positions of line ends
+#(every frame has natoms+2 lines), index is stored in sidecar file <trajectory>.index.npz
+#and reused while size and modification time of trajectory do not change
+#
+#index allows random access to frames (range of frames, every n-th frame) and parallel
+#parsing - disjoint ranges of frames are parsed by worker processes directly into shared
+#output array (memory-mapped temporary .npy file which becomes positions of trajectory, so
+#parsed coordinates are never copied), compressed files have no index and are parsed sequentially
+
+#os, tempfile, weakref and zipfile libraries - used for sidecar file (errors of damaged one) and temporary output file
+import os
+import tempfile
+import weakref
+import zipfile
+
+#numpy library
+import numpy as np
+
+#parser of blocks of frames
+from xyzreader import BLOCK_BYTES, Trajectory, join_cells, parse_frames, read_types
+
+
+#number of pieces of frames per worker process (balances unequal speed of workers)
+PIECES_PER_WORKER = 4
+
+
+#-------------------------------------------------------------------------------------------
+# byte offsets of frames - offsets[i] is beginning of frame i, offsets[nframes] is end of |
+# the last complete frame                                                                 |
+#-------------------------------------------------------------------------------------------
+class FrameIndex:
+
+	def __init__(self, offsets, natoms):
+		self.offsets = offsets
+		self.natoms = natoms
+
+	@property
+	def nframes(self):
+		return len(self.offsets) - 1
+
+
+#-------------------------------------------------------------------------------------------
+# index of frames from one pass over file - line ends are found by numpy in blocks, every |
+# (natoms+2)-th line end closes a frame, incomplete last frame is not indexed, end of file |
+# closes the last line if file does not end with line end                                 |
+#-------------------------------------------------------------------------------------------
+def build_index(fn, block_bytes=BLOCK_BYTES):
+
+	with open(fn, "rb") as fin:
+		data = fin.readline().split()
+		if len(data) != 1 or not data[0].isdigit():
+			raise ValueError("Invalid .xyz file: first line of frame has to contain number of atoms")
+		natoms = int(data[0])
+		nl = natoms + 2
+		fin.seek(0)
+
+		ends = [np.zeros(1, dtype=np.int64)]
+		nlines = 0
+		position = 0
+		last = b"\n"
+		while True:
+			block = fin.read(block_bytes)
+			if not block:
+				break
+			eol = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord("\n"))
+			first = (-(nlines + 1)) % nl
+			ends.append(position + eol[first::nl] + 1)
+			nlines += len(eol)
+			position += len(block)
+			last = block[-1:]
+
+		if last != b"\n" and (nlines + 1) % nl == 0:
+			ends.append(np.array([position], dtype=np.int64))
+
+	return FrameIndex(np.concatenate(ends).astype(np.int64), natoms)
+
+
+def index_path(fn):
+	return fn + ".index.npz"
+
+
+#--------------------------------------------------------------------------------------------
+# index from sidecar file if it matches trajectory (size, modification time), otherwise it |
+# is built and stored to sidecar if save is True (unwritable directory is ignored)         |
+#--------------------------------------------------------------------------------------------
+def load_index(fn, save=True):
+
+	st = os.stat(fn)
+	try:
+		with np.load(index_path(fn)) as sidecar:
+			if int(sidecar["size"]) == st.st_size and int(sidecar["mtime_ns"]) == st.st_mtime_ns:
+				return FrameIndex(sidecar["offsets"], int(sidecar["natoms"]))
+	except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+		pass
+
+	#unique temporary file of trajectory cache (trajcache imports this module, so it is imported here)
+	from trajcache import replace_file
+	index = build_index(fn)
+	if save:
+		try:
+			with replace_file(index_path(fn), "wb") as fout:
+				np.savez(fout, offsets=index.offsets, natoms=index.natoms, size=st.st_size, mtime_ns=st.st_mtime_ns)
+		except OSError:
+			pass
+	return index
+
+
+#runs of consecutive frames (first, count) of sorted frame numbers
+def frame_runs(frames):
+
+	breaks = np.flatnonzero(np.diff(frames) != 1) + 1
+	starts = np.concatenate(([0], breaks))
+	counts = np.diff(np.concatenate((starts, [len(frames)])))
+	return list(zip(frames[starts].tolist(), counts.tolist()))
+
+
+#---------------------------------------------------------------------------------------------
+# parse selected frames into out (rows in order of frames), runs of consecutive frames are |
+# read in blocks of about BLOCK_BYTES, offsets start at frame base, returns frame times and |
+# cells (None without Lattice in headers)                                                   |
+#---------------------------------------------------------------------------------------------
+def parse_selected(fn, offsets, natoms, frames, out, base=0):
+
+	frame_bytes = max(1, (offsets[-1] - offsets[0])//(len(offsets) - 1))
+	block = max(1, BLOCK_BYTES//frame_bytes)
+	times = []
+	cells = []
+	row = 0
+	with open(fn, "rb") as fin:
+		for first, count in frame_runs(frames):
+			for f0 in range(first, first+count, block):
+				n = min(block, first+count-f0)
+				fin.seek(offsets[f0-base])
+				lines = fin.read(offsets[f0-base+n] - offsets[f0-base]).split(b"\n")
+				xyz, t, cell = parse_frames(lines, natoms, n, f0, out.dtype)
+				out[row:row+n] = xyz
+				times.append(t)
+				cells.append(cell)
+				row += n
+	return np.concatenate(times), join_cells(cells)
+
+
+#output .npy file memory-mapped in worker process, rows of piece of frames are filled by worker
+def _worker_parse(fn, offsets, natoms, frames, base, row, path):
+
+	out = np.load(path, mmap_mode="r+")
+	try:
+		return parse_selected(fn, offsets, natoms, frames, out[row:row+len(frames)], base)
+	finally:
+		del out
+
+
+#temporary output file is removed when the last view of positions is released
+def remove_file(path):
+	try:
+		os.remove(path)
+	except OSError:
+		pass
+
+
+#-------------------------------------------------------------------------------------------------
+# positions (nselected, natoms, 3) of precision dtype, times and cells of frames selected by     |
+# slice, with workers > 1 pieces of frames are parsed by worker processes into memory-mapped    |
+# temporary file (in TMPDIR) which is returned as positions and removed when they are released  |
+#-------------------------------------------------------------------------------------------------
+def read_indexed(fn, index, frames=None, workers=1, dtype=np.float64):
+
+	selected = np.arange(index.nframes)[frames if frames is not None else slice(None)]
+	if len(selected) == 0:
+		raise ValueError("Invalid .xyz file or frame selection: no complete frame is selected")
+	shape = (len(selected), index.natoms, 3)
+
+	if workers <= 1:
+		positions = np.empty(shape, dtype=dtype)
+		times, cells = parse_selected(fn, index.offsets, index.natoms, selected, positions)
+		return positions, times, cells
+
+	#process pool is imported only for parallel parsing (startup time)
+	from concurrent.futures import ProcessPoolExecutor
+
+	#only offsets of frames of the piece are sent to worker
+	pieces = np.array_split(np.arange(len(selected)), min(len(selected), workers*PIECES_PER_WORKER))
+	fd, path = tempfile.mkstemp(prefix="msdiff.", suffix=".npy")
+	os.close(fd)
+	try:
+		positions = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+		weakref.finalize(positions.base, remove_file, path)
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			futures = []
+			for piece in pieces:
+				first, last = selected[piece[0]], selected[piece[-1]]
+				futures.append(pool.submit(_worker_parse, fn, index.offsets[first:last+2], index.natoms, selected[piece],
+					first, int(piece[0]), path))
+			results = [future.result() for future in futures]
+			times = np.concatenate([t for t, _ in results])
+			cells = join_cells([cell for _, cell in results])
+	except BaseException:
+		remove_file(path)
+		raise
+	return positions, times, cells
+
+
+#trajectory of selected frames (slice) of plain .xyz file in precision dtype, index is reused from sidecar file
+def read_frames(fn, frames=None, workers=1, save_index=True, dtype=np.float64):
+
+	positions, times, cells = read_indexed(fn, load_index(fn, save_index), frames, workers, dtype)
+	types, species = read_types(fn)
+	return Trajectory(positions, times, types=types, species=species, cells=cells)
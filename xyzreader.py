@@ -0,0 +1,283 @@
+#XYZ trajectory reader - parses .xyz file in one pass and in blocks of lines directly
+#into numpy array with shape (nframes, natoms, 3)
+#
+#every configuration in .xyz file consists of:
+# line with number of atoms
+# header line, if header has 3 tokens (e.g. "time = 100") then the third token is frame time
+# natoms lines with 4 tokens: atom type x y z
+#
+#extended XYZ headers are key=value pairs (values can be quoted), Time= is frame time,
+#Lattice="ax ay az bx by bz cx cy cz" is cell of the frame (lattice vectors, also triclinic)
+#and Properties=species:S:1:pos:R:3:... gives columns of atom lines, e.g.
+# Lattice="10.0 0.0 0.0 0.0 10.0 0.0 0.0 0.0 10.0" Properties=species:S:1:pos:R:3 Time=0.5
+#headers of whole block of frames are parsed at once by regular expressions
+#
+#compressed files (gzip, bzip2, xz, zstd) are decompressed on the fly (see xyzstream)
+#
+#positions are stored in double precision by default, single precision halves memory of
+#trajectory - coordinates are converted back to double precision per chunk of atoms before
+#unwrapping and MSD (see msdengine), so only rounding of stored coordinates is lost
+
+#os library - used for file size which estimates number of frames
+import os
+
+#re library - used for parsing of extended XYZ headers
+import re
+
+#numpy library
+import numpy as np
+
+#box detection with vectorized reductions
+from pbc import box_bounds
+
+#plain and compressed input streams
+from xyzstream import open_xyz
+
+
+#approximate number of bytes read and parsed at once
+BLOCK_BYTES = 1 << 24
+
+#storage precision of positions
+PRECISIONS = {
+	"double": np.float64,
+	"single": np.float32,
+}
+
+#columns of atom lines (number of columns, first position column, species column)
+ATOM_LAYOUT = (4, 1, 0)
+
+#values of extended XYZ headers
+HEADER_TIME = re.compile(rb'(?<![\w"])time=("?)([^\s"]+)\1', re.IGNORECASE)
+HEADER_LATTICE = re.compile(rb'(?<![\w"])lattice="([^"]*)"', re.IGNORECASE)
+HEADER_PROPERTIES = re.compile(rb'(?<![\w"])properties=(\S+)', re.IGNORECASE)
+
+
+#-----------------------------------------------------------------------------------------
+# parsed trajectory - positions and frame times, box bounds are stored if already known, |
+# atom types are compact integer array with indices to list of species names,            |
+# cells (nframes, 3, 3) are per-frame cells from extended XYZ headers or None            |
+#-----------------------------------------------------------------------------------------
+class Trajectory:
+
+	def __init__(self, positions, times, bounds=None, types=None, species=None, cells=None):
+		self.positions = positions
+		self.times = times
+		self.bounds = bounds
+		self.types = types
+		self.species = species
+		self.cells = cells
+
+	@property
+	def nframes(self):
+		return self.positions.shape[0]
+
+	@property
+	def natoms(self):
+		return self.positions.shape[1]
+
+	#coordinates with shape (natoms, nframes, 3) used by unwrapping and MSD engines
+	def atom_series(self):
+		return self.positions.swapaxes(0,1)
+
+	#trajectory of frames selected by slice (view of positions), box bounds are detected from selected frames
+	def select(self, frames):
+		return Trajectory(self.positions[frames], self.times[frames], None, self.types, self.species,
+			None if self.cells is None else self.cells[frames])
+
+	#min and max particle coordinates in every dimension - automatic PBC detection
+	def box_bounds(self):
+		if self.bounds is None:
+			self.bounds = box_bounds(self.positions)
+		return self.bounds
+
+
+#columns of atom lines from extended XYZ Properties=name:type:count:name:type:count:...
+def atom_layout(header):
+
+	match = HEADER_PROPERTIES.search(header)
+	if match is None:
+		return ATOM_LAYOUT
+	fields = match.group(1).strip(b'"').split(b":")
+	columns = {}
+	ncols = 0
+	try:
+		for name, count in zip(fields[::3], fields[2::3]):
+			columns[name.lower()] = ncols
+			ncols += int(count)
+	except ValueError:
+		raise ValueError("Invalid extended .xyz header: Properties={}".format(match.group(1).decode(errors="replace")))
+	if b"pos" not in columns:
+		raise ValueError("Invalid extended .xyz header: Properties do not contain pos")
+	return ncols, columns[b"pos"], columns.get(b"species", 0)
+
+
+#------------------------------------------------------------------------------------------
+# times and cells of block of header lines - Time= and Lattice= of extended XYZ headers are |
+# found in all headers at once, plain headers use header_time, cells are None without     |
+# Lattice                                                                                |
+#------------------------------------------------------------------------------------------
+def parse_headers(headers, first_frame=0):
+
+	nfr = len(headers)
+	text = b"\n".join(headers)
+
+	lattices = HEADER_LATTICE.findall(text)
+	cells = None
+	if lattices:
+		if len(lattices) != nfr:
+			raise ValueError("Invalid extended .xyz file: frames {}-{} do not all contain Lattice in header".format(first_frame+1, first_frame+nfr))
+		cells = np.array(b" ".join(lattices).split(), dtype=np.float64)
+		if len(cells) != 9*nfr:
+			raise ValueError("Invalid extended .xyz file: Lattice of frames {}-{} does not contain 9 values".format(first_frame+1, first_frame+nfr))
+		cells = cells.reshape(nfr, 3, 3)
+
+	times = [value for _, value in HEADER_TIME.findall(text)]
+	if len(times) == nfr:
+		times = np.array(times, dtype=np.float64)
+	else:
+		times = np.array([header_time(header, first_frame+k) for k, header in enumerate(headers)])
+	return times, cells
+
+
+#time of frame from header line (Time= of extended XYZ or the third of 3 tokens), frames without time are numbered
+def header_time(header, iframe):
+	match = HEADER_TIME.search(header)
+	if match is not None:
+		return float(match.group(2))
+	data = header.split()
+	if len(data) == 3:
+		return float(data[2])
+	return float(iframe)
+
+
+#--------------------------------------------------------------------------------------------
+# parse block of complete frames, lines of one frame: natoms, header, natoms atom lines,   |
+# returns (positions, times, cells), cells are None if headers do not contain Lattice      |
+#--------------------------------------------------------------------------------------------
+def parse_frames(lines, natoms, nfr, first_frame=0, dtype=np.float64):
+
+	nl = natoms + 2
+	headers = lines[1:nfr*nl:nl]
+	times, cells = parse_headers(headers, first_frame)
+	ncols, pos, _ = atom_layout(headers[0])
+
+	atom_lines = []
+	for k in range(nfr):
+		atom_lines.extend(lines[k*nl+2:(k+1)*nl])
+	tokens = b" ".join(atom_lines).split()
+	if len(tokens) != ncols*natoms*nfr:
+		raise ValueError("Invalid .xyz file: frames {}-{} do not contain {} atom lines with {} values".format(first_frame+1, first_frame+nfr, natoms, ncols))
+
+	#drop atom types (and other columns of extended XYZ), remaining tokens are coordinates
+	if (ncols, pos) == ATOM_LAYOUT[:2]:
+		del tokens[::4]
+		xyz = np.array(tokens).astype(dtype).reshape(nfr, natoms, 3)
+	else:
+		xyz = np.array(tokens).reshape(nfr, natoms, ncols)[:, :, pos:pos+3].astype(dtype)
+	return xyz, times, cells
+
+
+#-----------------------------------------------------------------------------------------
+# atom types from the first frame - (types, species), types[ia] is index to species names |
+#-----------------------------------------------------------------------------------------
+def read_types(fn, offset=0):
+
+	with open_xyz(fn, offset) as fin:
+		data = fin.readline().split()
+		if len(data) != 1 or not data[0].isdigit():
+			raise ValueError("Invalid .xyz file: first line of frame has to contain number of atoms")
+		natoms = int(data[0])
+		_, _, column = atom_layout(fin.readline())
+		labels = [fin.readline().split()[column].decode() for ia in range(natoms)]
+
+	species, types = np.unique(labels, return_inverse=True)
+	return types.astype(np.min_scalar_type(len(species))), [str(name) for name in species]
+
+
+#-----------------------------------------------------------------------------------------------
+# parse .xyz file in blocks of complete frames, yields (positions, times, cells, offset) where |
+# offset is position in file after the last complete frame of the block (see parse_frames)    |
+# parsing can continue from offset of previous call (frame numbering from first_frame), with  |
+# follow=True line without end of line is not parsed because it is still being written,       |
+# positions are parsed into dtype                                                              |
+#-----------------------------------------------------------------------------------------------
+def iter_xyz(fn, block_bytes=BLOCK_BYTES, offset=0, first_frame=0, follow=False, dtype=np.float64):
+
+	with open_xyz(fn, offset) as fin:
+
+		line = fin.readline()
+		if (offset > 0 or follow) and not line.endswith(b"\n"):
+			return
+		data = line.split()
+		if len(data) != 1 or not data[0].isdigit():
+			raise ValueError("Invalid .xyz file: first line of frame has to contain number of atoms")
+		natoms = int(data[0])
+		nl = natoms + 2
+
+		#first line stays in buffer of lines, position = offset after the last line read
+		nt = 0
+		lines = [line]
+		position = offset + len(line)
+		while True:
+			block = fin.readlines(block_bytes)
+			partial = follow and block and not block[-1].endswith(b"\n")
+			if partial:
+				block.pop()
+			position += sum(len(line) for line in block)
+			lines.extend(block)
+			nfr = len(lines)//nl
+			if nfr > 0:
+				xyz, t, cells = parse_frames(lines, natoms, nfr, first_frame+nt, dtype)
+				del lines[:nfr*nl]
+				nt += nfr
+				yield xyz, t, cells, position - sum(len(line) for line in lines)
+
+			#reading stops at line which is still being written - rest of the line appended later
+			#would be read as a separate line, next call continues from the last returned offset
+			if partial or not block:
+				break
+
+	#incomplete last frame is ignored (e.g. trajectory which is still written)
+	if nt == 0 and offset == 0 and not follow:
+		raise ValueError("Invalid .xyz file: file does not contain complete frame")
+
+
+#---------------------------------------------------------------------------------------
+# read whole .xyz file, frames are parsed in blocks into preallocated growable array |
+# with storage precision dtype                                                          |
+#---------------------------------------------------------------------------------------
+def read_xyz(fn, block_bytes=BLOCK_BYTES, dtype=np.float64):
+
+	filesize = os.path.getsize(fn)
+	positions = None
+	times = []
+	cells = []
+	nt = 0
+	for xyz, t, cell, offset in iter_xyz(fn, block_bytes, dtype=dtype):
+		nfr, natoms, _ = xyz.shape
+
+		#allocate array for all frames estimated from file size, grow if estimate was low
+		if positions is None:
+			frame_bytes = max(1, offset//nfr)
+			positions = np.empty((filesize//frame_bytes + 1, natoms, 3), dtype=dtype)
+		if nt + nfr > positions.shape[0]:
+			grown = np.empty((max(2*positions.shape[0], nt+nfr), natoms, 3), dtype=dtype)
+			grown[:nt] = positions[:nt]
+			positions = grown
+		positions[nt:nt+nfr] = xyz
+		times.append(t)
+		cells.append(cell)
+		nt += nfr
+
+	types, species = read_types(fn)
+	return Trajectory(positions[:nt], np.concatenate(times), types=types, species=species, cells=join_cells(cells))
+
+
+#per-frame cells of blocks of frames joined, None if frames have no cells
+def join_cells(cells):
+
+	if all(cell is None for cell in cells):
+		return None
+	if any(cell is None for cell in cells):
+		raise ValueError("Invalid extended .xyz file: only some frames contain Lattice in header")
+	return np.concatenate(cells)
@@ -0,0 +1,211 @@
+#input streams of .xyz trajectories - plain files or compressed files (gzip, bzip2, xz, zstd)
+#which are detected by magic bytes and decompressed on the fly, so decompressed trajectory
+#never touches disk
+#
+#decompression runs in background thread which reads ahead in large blocks while parser works
+#on previous blocks, BGZF files (gzip made of independent members with sizes in headers, e.g.
+#from bgzip) are decompressed by several members in parallel
+
+#io, queue and threading libraries - used for read-ahead stream
+import io
+import queue
+import threading
+
+#compression libraries of standard library
+import bz2
+import gzip
+import lzma
+import zlib
+
+#struct library - used for headers of BGZF members
+import struct
+
+
+#magic bytes of compressed formats
+MAGIC = [
+	(b"\x1f\x8b", "gzip"),
+	(b"BZh", "bz2"),
+	(b"\xfd7zXZ\x00", "xz"),
+	(b"\x28\xb5\x2f\xfd", "zstd"),
+]
+
+#size of decompressed blocks, number of blocks decompressed ahead of parser
+DECOMPRESS_BYTES = 1 << 22
+READ_AHEAD_BLOCKS = 4
+
+#number of BGZF members decompressed at once by pool of threads
+BGZF_BATCH = 64
+BGZF_THREADS = 4
+
+
+#compression of file from magic bytes, None for plain file
+def detect_compression(fn):
+
+	with open(fn, "rb") as fin:
+		head = fin.read(6)
+	for magic, name in MAGIC:
+		if head.startswith(magic):
+			return name
+	return None
+
+
+#zstd decompressor - module of standard library (Python 3.14+) or zstandard package
+def open_zstd(fn):
+
+	try:
+		from compression import zstd
+		return zstd.open(fn, "rb")
+	except ImportError:
+		pass
+	try:
+		import zstandard
+	except ImportError:
+		raise ValueError("Zstandard compressed trajectory needs zstandard package (pip install zstandard)")
+	return zstandard.ZstdDecompressor().stream_reader(open(fn, "rb"), closefd=True)
+
+
+#------------------------------------------------------------------------------------------
+# BGZF file - gzip members with extra field "BC" which contains size of member, returns |
+# None if file is not BGZF                                                                |
+#------------------------------------------------------------------------------------------
+def bgzf_member_size(header):
+
+	if len(header) < 18 or header[:4] != b"\x1f\x8b\x08\x04":
+		return None
+	xlen = struct.unpack("<H", header[10:12])[0]
+	extra = header[12:12+xlen]
+	while len(extra) >= 4:
+		si, slen = extra[:2], struct.unpack("<H", extra[2:4])[0]
+		if si == b"BC" and slen == 2:
+			return struct.unpack("<H", extra[4:6])[0] + 1
+		extra = extra[4+slen:]
+	return None
+
+
+def is_bgzf(fn):
+	with open(fn, "rb") as fin:
+		return bgzf_member_size(fin.read(18)) is not None
+
+
+#decompressed blocks of BGZF file, batches of members are decompressed by pool of threads
+#(zlib releases GIL)
+def bgzf_blocks(fn):
+
+	from concurrent.futures import ThreadPoolExecutor
+	with open(fn, "rb") as fin, ThreadPoolExecutor(BGZF_THREADS) as pool:
+		while True:
+			members = []
+			while len(members) < BGZF_BATCH:
+				header = fin.read(18)
+				if not header:
+					break
+				size = bgzf_member_size(header)
+				if size is None:
+					raise ValueError("Invalid BGZF member in compressed trajectory")
+				members.append(header + fin.read(size - 18))
+			if not members:
+				return
+			for block in pool.map(lambda member: zlib.decompress(member, 31), members):
+				yield block
+
+
+#decompressed blocks of stream
+def stream_blocks(stream):
+
+	with stream:
+		while True:
+			block = stream.read(DECOMPRESS_BYTES)
+			if not block:
+				return
+			yield block
+
+
+#------------------------------------------------------------------------------------------
+# raw stream filled by background thread - blocks from generator are queued ahead of   |
+# reader, errors of decompression are raised in reader                                  |
+#------------------------------------------------------------------------------------------
+class ReadAhead(io.RawIOBase):
+
+	def __init__(self, blocks, depth=READ_AHEAD_BLOCKS):
+		super().__init__()
+		self.queue = queue.Queue(depth)
+		self.stop = threading.Event()
+		self.block = memoryview(b"")
+		self.eof = False
+		self.thread = threading.Thread(target=self.fill, args=(blocks,), daemon=True)
+		self.thread.start()
+
+	def fill(self, blocks):
+		try:
+			for block in blocks:
+				if not self.put(block):
+					return
+			self.put(None)
+		except Exception as e:
+			self.put(e)
+		finally:
+			blocks.close()
+
+	#put block into queue unless reader was closed
+	def put(self, item):
+		while not self.stop.is_set():
+			try:
+				self.queue.put(item, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def readable(self):
+		return True
+
+	def readinto(self, buffer):
+
+		while not self.block and not self.eof:
+			item = self.queue.get()
+			if isinstance(item, Exception):
+				raise ValueError("Decompression of trajectory failed: {}".format(item))
+			if item is None:
+				self.eof = True
+			else:
+				self.block = memoryview(item)
+		n = min(len(buffer), len(self.block))
+		buffer[:n] = self.block[:n]
+		self.block = self.block[n:]
+		return n
+
+	def close(self):
+		self.stop.set()
+		super().close()
+
+
+#---------------------------------------------------------------------------------------------
+# binary stream of decompressed .xyz file positioned at offset (offset in decompressed data), |
+# plain files are opened directly                                                             |
+#---------------------------------------------------------------------------------------------
+def open_xyz(fn, offset=0):
+
+	compression = detect_compression(fn)
+	if compression is None:
+		fin = open(fn, "rb")
+		fin.seek(offset)
+		return fin
+
+	if compression == "gzip" and is_bgzf(fn):
+		blocks = bgzf_blocks(fn)
+	elif compression == "gzip":
+		blocks = stream_blocks(gzip.open(fn, "rb"))
+	elif compression == "bz2":
+		blocks = stream_blocks(bz2.open(fn, "rb"))
+	elif compression == "xz":
+		blocks = stream_blocks(lzma.open(fn, "rb"))
+	else:
+		blocks = stream_blocks(open_zstd(fn))
+
+	fin = io.BufferedReader(ReadAhead(blocks), DECOMPRESS_BYTES)
+	while offset > 0:
+		skipped = len(fin.read(min(offset, DECOMPRESS_BYTES)))
+		if skipped == 0:
+			break
+		offset -= skipped
+	return fin